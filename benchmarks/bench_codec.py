@@ -0,0 +1,50 @@
+"""
+Compare the json codecs on gateway frames.
+
+    python benchmarks/bench_codec.py [frames.jsonl]
+
+Frames are read one per line from the given file (for example a capture
+of the websocket), otherwise synthetic message_create frames are used.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "blackboxapi"))
+
+from codec import BACKENDS, get_codec  # noqa: E402
+from payloads import message_frames  # noqa: E402
+
+
+def load_frames(path):
+    with open(path, "rb") as f:
+        return [line.rstrip(b"\n") for line in f if line.strip()]
+
+
+def main():
+    if len(sys.argv) > 1:
+        frames = load_frames(sys.argv[1])
+    else:
+        json_codec = get_codec("json")
+        frames = [json_codec.dumps(frame) for frame in message_frames(20_000)]
+    total = sum(len(frame) for frame in frames)
+    print(f"{len(frames)} frames, {total / len(frames):.0f} bytes avg")
+    for name in BACKENDS:
+        try:
+            codec = get_codec(name)
+        except ImportError:
+            print(f"{name:8} not installed")
+            continue
+        start = time.perf_counter()
+        objects = [codec.loads(frame) for frame in frames]
+        decode = time.perf_counter() - start
+        start = time.perf_counter()
+        for obj in objects:
+            codec.dumps(obj)
+        encode = time.perf_counter() - start
+        print(f"{name:8} decode {total / decode / 1e6:7.1f} MB/s {len(frames) / decode:10.0f} frames/s"
+              f"   encode {len(frames) / encode:10.0f} frames/s")
+
+
+if __name__ == "__main__":
+    main()
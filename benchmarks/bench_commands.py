@@ -0,0 +1,104 @@
+"""
+Routing cost per message with 500 registered commands.
+
+    python benchmarks/bench_commands.py [messages]
+
+Compares Router.dispatch with the split and compare chain bots write by
+hand inside on_message_create (what the core.py demo does), on a mix of
+plain chat, unknown commands and commands with arguments. The commands
+themselves do nothing so only the routing is timed.
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "blackboxapi"))
+
+from commands import Router  # noqa: E402
+from events import Msg  # noqa: E402
+
+COMMANDS = 500
+
+
+class StubClient:
+    async def get_self(self):
+        return Msg.decode({"id": "0", "guildId": "0", "content": ""})
+
+
+def build_router():
+    router = Router(prefix="!")
+    for index in range(COMMANDS):
+        async def command(ctx, target: str = "", amount: int = 0):
+            pass
+        router.command(f"command{index}")(command)
+    return router
+
+
+async def hand_written(msg, names, self_id="0"):
+    # the demo's approach: self check, split, strip the prefix, compare against every name
+    if self_id == msg.author.id:
+        return
+    command, *args = msg.content.split(" ")
+    if not command.startswith("!"):
+        return
+    command = command[1:]
+    for name in names:
+        if command == name:
+            if args:
+                int(args[1]) if len(args) > 1 else 0
+            return
+
+
+def messages(count):
+    rng = random.Random(0)
+    result = []
+    for index in range(count):
+        roll = rng.random()
+        if roll < 0.5:
+            content = f"just chatting, message {index} with a few more words in it"
+        elif roll < 0.6:
+            content = f"!unknown{index} some args"
+        else:
+            content = f"!command{rng.randrange(COMMANDS)} user{index} {index}"
+        result.append(Msg.decode({"id": str(index), "guildId": "1", "content": content, "author": {"id": "5"}}))
+    return result
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    router = build_router()
+    client = StubClient()
+    names = [f"command{index}" for index in range(COMMANDS)]
+    print(f"{count} messages, {COMMANDS} commands")
+
+    # fresh messages for every run, the lazy author is decoded on first access
+    msgs = messages(count)
+    start = time.perf_counter()
+    for msg in msgs:
+        await hand_written(msg, names)
+    elapsed = time.perf_counter() - start
+    print(f"{'hand written chain':24} {elapsed / count * 1e6:7.2f}us/message")
+
+    msgs = messages(count)
+    start = time.perf_counter()
+    for msg in msgs:
+        await router.dispatch(client, msg)
+    elapsed = time.perf_counter() - start
+    print(f"{'Router.dispatch':24} {elapsed / count * 1e6:7.2f}us/message")
+
+    @router.middleware
+    async def passthrough(ctx, call_next):
+        await call_next()
+
+    msgs = messages(count)
+    start = time.perf_counter()
+    for msg in msgs:
+        await router.dispatch(client, msg)
+    elapsed = time.perf_counter() - start
+    print(f"{'Router, 1 middleware':24} {elapsed / count * 1e6:7.2f}us/message")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,141 @@
+"""
+Gateway throughput and handler latency.
+
+    python benchmarks/bench_gateway.py [events] [rate] [frames.jsonl]
+
+First feeds frames straight into Client._process and Controller._process_event
+to measure events per second without a socket, then replays them through
+FakeServer to a connected client and reports end to end events per second
+and handler latency (frame sent -> handler running), with frames decoded
+on the loop or on a FrameDecoder pool, and with each gateway compression
+mode. `rate` paces the replay
+in frames per second, 0 sends as fast as possible. Frames come from the
+capture file when given, otherwise synthetic message_create frames are used.
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "blackboxapi"))
+
+from core import Client  # noqa: E402
+from dispatcher import Dispatcher  # noqa: E402
+from decoder import FrameDecoder  # noqa: E402
+from transport import Transport  # noqa: E402
+from fakeserver import FakeServer, load_frames  # noqa: E402
+from payloads import message_frames  # noqa: E402
+
+
+class BenchClient(Client):
+    def __init__(self, expected, server=None, **kwargs):
+        super().__init__(token="token", **kwargs)
+        self.expected = expected
+        self.server = server
+        self.handled = 0
+        self.latencies = []
+        self.done = asyncio.Event()
+
+    async def on_message_create(self, msg):
+        if self.server is not None:
+            self.latencies.append(time.perf_counter() - self.server.sent_at[msg.id])
+        self.handled += 1
+        if self.handled == self.expected:
+            self.done.set()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def bench_process(frames, **kwargs):
+    client = BenchClient(len(frames), **kwargs)
+    if client.dispatcher is not None:
+        client.dispatcher.start(client.tasks)
+    start = time.perf_counter()
+    for frame in frames:
+        await client._process(frame)
+    await client.done.wait()
+    elapsed = time.perf_counter() - start
+    await client.tasks.stop_tasks()
+    return len(frames) / elapsed
+
+
+async def bench_process_event(frames):
+    # already decoded frames, only the event routing and handler scheduling is timed
+    decoded = [json.loads(frame) for frame in frames]
+    client = BenchClient(len(frames))
+    start = time.perf_counter()
+    for frame in decoded:
+        await client._process_event(frame["data"], frame["event"])
+    await client.done.wait()
+    elapsed = time.perf_counter() - start
+    await client.tasks.stop_tasks()
+    return len(frames) / elapsed
+
+
+async def bench_unhandled(frames):
+    # no on_message_create, the frames are skipped before the model is built
+    client = Client(token="token")
+    start = time.perf_counter()
+    for frame in frames:
+        await client._process(frame)
+    elapsed = time.perf_counter() - start
+    assert client.events_skipped == len(frames)
+    return len(frames) / elapsed
+
+
+async def bench_end_to_end(frames, rate, **kwargs):
+    server = FakeServer(frames, rate=rate or None)
+    await server.start()
+    client = BenchClient(len(frames), server, transport=Transport(endpoint=server.endpoint), reconnect=False, **kwargs)
+    runner = asyncio.ensure_future(client.start())
+    try:
+        await asyncio.wait_for(client.done.wait(), 60 + (len(frames) / rate if rate else 0))
+        first = min(server.sent_at.values())
+        elapsed = time.perf_counter() - first
+    finally:
+        await client.close()
+        await runner
+        await server.stop()
+    return len(frames) / elapsed, client
+
+
+async def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 0
+    if len(sys.argv) > 3:
+        frames = [frame for frame in load_frames(sys.argv[3]) if json.loads(frame)["event"] == "MESSAGE_CREATE"][:total]
+    else:
+        frames = [json.dumps(frame) for frame in message_frames(total)]
+    print(f"{len(frames)} message_create frames")
+
+    print(f"{'_process_event':34} {await bench_process_event(frames):9.0f} events/s")
+    print(f"{'_process':34} {await bench_process(frames):9.0f} events/s")
+    print(f"{'_process, cache':34} {await bench_process(frames, cache=True):9.0f} events/s")
+    print(f"{'_process, no handler':34} {await bench_unhandled(frames):9.0f} events/s")
+    print(f"{'_process, dispatcher':34} {await bench_process(frames, dispatcher=Dispatcher()):9.0f} events/s")
+
+    print(f"end to end, rate {'unlimited' if not rate else f'{rate:.0f}/s'}")
+    variants = (
+        ("task per event", {}),
+        ("dispatcher", {"dispatcher": Dispatcher()}),
+        ("thread decoder", {"decoder": FrameDecoder(executor="thread", workers=2)}),
+        ("process decoder", {"decoder": FrameDecoder(executor="process", workers=4)}),
+        ("no compression", {"compression": None}),
+        ("zlib-stream", {"compression": "zlib-stream"}),
+    )
+    for name, kwargs in variants:
+        throughput, client = await bench_end_to_end(frames, rate, **kwargs)
+        latencies = client.latencies
+        print(f"  {name:32} {throughput:9.0f} events/s"
+              f"  p50 {percentile(latencies, 0.5) * 1000:7.2f}ms  p99 {percentile(latencies, 0.99) * 1000:7.2f}ms")
+        stats = client.compression_stats
+        if stats.frames:
+            print(f"  {'':32} ratio {stats.ratio:.1f}x, inflate {stats.inflate_time / stats.frames * 1e6:.1f}us/frame")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
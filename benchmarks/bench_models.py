@@ -0,0 +1,88 @@
+"""
+Compare construction time and memory of the event models against the
+eager dict based classes they replaced.
+
+    python benchmarks/bench_models.py [count]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "blackboxapi"))
+
+from events import Msg  # noqa: E402
+from payloads import message_create  # noqa: E402
+
+
+# eager versions kept here for comparison
+class EagerUser:
+    def __init__(self, id, name=None, imageId=None, email=None, flags=None, options=None, permissions=None):
+        self.id = id
+        self.name = name
+        self.image_id = imageId
+        self.email = email
+        self.flags = flags
+        self.options = options
+        self.permissions = permissions
+
+
+class EagerAttachment:
+    def __init__(self, id, filename, type):
+        self.id = id
+        self.filename = filename
+        self.type = type
+
+
+class EagerMsg:
+    def __init__(self, id, guildId, content, author=None, created=None, modified=None, msgSaved=None, requestId=None, mentionsEveryone=None, mentions=None, attachments=None):
+        self.id = id
+        self.author = EagerUser(**author) if author is not None else None
+        self.content = content
+        self.guild_id = guildId
+        self.created = created
+        self.modified = modified
+        self.msg_saved = msgSaved
+        self.request_id = requestId
+        self.mentions_everyone = mentionsEveryone
+        self.mentions = [EagerUser(**mention) for mention in mentions] if mentions is not None else None
+        self.attachments = [EagerAttachment(**attachment)
+                            for attachment in attachments] if attachments is not None else None
+
+
+def bench(build, payloads, touch):
+    start = time.perf_counter()
+    objects = [build(payload) for payload in payloads]
+    if touch:
+        for obj in objects:
+            obj.author.name
+    elapsed = time.perf_counter() - start
+
+    # payload dicts are shared by both runs so only the models are measured
+    tracemalloc.start()
+    objects = [build(payload) for payload in payloads]
+    if touch:
+        for obj in objects:
+            obj.author.name
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return elapsed, size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    payloads = [message_create(index) for index in range(count)]
+    print(f"{count} message_create payloads")
+    for label, touch in (("content only", False), ("author accessed", True)):
+        for name, build in (
+            ("eager", lambda payload: EagerMsg(**payload)),
+            ("lazy", lambda payload: Msg(**payload)),
+            ("decode", Msg.decode),
+        ):
+            elapsed, size = bench(build, payloads, touch)
+            print(f"{label:16} {name:6} {elapsed * 1000:9.1f} ms  {size / count:7.1f} bytes/msg")
+
+
+if __name__ == "__main__":
+    main()
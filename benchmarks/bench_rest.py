@@ -0,0 +1,59 @@
+"""
+Requests per second through Caller against the REST routes of FakeServer.
+
+    python benchmarks/bench_rest.py [requests] [concurrency]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "blackboxapi"))
+
+from helpers import Caller  # noqa: E402
+from transport import Transport  # noqa: E402
+from fakeserver import FakeServer  # noqa: E402
+
+
+async def run(caller, total, concurrency, call):
+    caller._start_session()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index):
+        async with semaphore:
+            await call(caller, index)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(total)))
+    elapsed = time.perf_counter() - start
+    await caller._stop_session()
+    return total / elapsed
+
+
+async def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    server = FakeServer()
+    await server.start()
+    endpoint = server.endpoint
+    configs = {
+        "limit=10": Transport(endpoint=endpoint, limit=10),
+        "limit=100": Transport(endpoint=endpoint, limit=100),
+        "limit=100, no keep-alive": Transport(endpoint=endpoint, limit=100, keepalive_timeout=0),
+    }
+    calls = {
+        "get_user": lambda caller, index: caller.get_user(str(index)),
+        "send_message": lambda caller, index: caller.send_message("1", "hello"),
+    }
+    print(f"{total} requests, {concurrency} concurrent")
+    try:
+        for call_name, call in calls.items():
+            for name, transport in configs.items():
+                rate = await run(Caller("token", transport=transport), total, concurrency, call)
+                print(f"{call_name:13} {name:26} {rate:9.0f} req/s")
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+"""
+Startup time: importing the package and a fresh process reaching READY.
+
+    python benchmarks/bench_startup.py [runs]
+
+Every run is a new interpreter, since imports are only slow the first
+time. It reports the time spent in `import blackboxapi`, in importing
+Client (which is when the client modules load), and from the start of the
+script to on_ready against FakeServer, then to run() returning after
+close. "eager" imports aiohttp and websockets up front like the package
+used to, "debug" runs in asyncio debug mode, which run() used to force on,
+and "uvloop" runs on uvloop, skipped when uvloop is not installed.
+"""
+import asyncio
+import json
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fakeserver import FakeServer  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+CHILD = """
+import json
+import sys
+import time
+start = time.perf_counter()
+variant = sys.argv[2]
+if variant == "eager":
+    import aiohttp, websockets.client
+import blackboxapi
+package = time.perf_counter()
+from blackboxapi import Client, Transport
+imported = time.perf_counter()
+client = Client(token="token", transport=Transport(endpoint=sys.argv[1]))
+ready_at = None
+
+@client.event
+async def ready(self):
+    global ready_at
+    ready_at = time.perf_counter()
+    await self.close()
+
+client.run(debug=variant == "debug", use_uvloop=variant == "uvloop")
+end = time.perf_counter()
+print(json.dumps({"package": package - start, "import": imported - start, "ready": ready_at - start, "exit": end - start}))
+"""
+
+
+async def run_child(endpoint, variant):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, os.path.join(ROOT, "blackboxapi")]))
+    process = await asyncio.create_subprocess_exec(sys.executable, "-c", CHILD, endpoint, variant,
+                                                   stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                                                   env=env)
+    # debug mode logs slow callbacks to stderr, only shown when the run fails
+    stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"{variant} run exited with {process.returncode}:\n{stderr.decode()}")
+    return json.loads(stdout.decode().strip().splitlines()[-1])
+
+
+async def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    variants = ["lazy", "eager", "debug"]
+    try:
+        import uvloop  # noqa: F401
+        variants.append("uvloop")
+    except ImportError:
+        print("uvloop not installed, skipping it")
+    async with FakeServer() as server:
+        print(f"{runs} runs, median ms since the script started")
+        print(f"{'':8} {'package':>8} {'import':>8} {'ready':>8} {'exit':>8}")
+        for variant in variants:
+            results = [await run_child(server.endpoint, variant) for _ in range(runs)]
+            medians = [statistics.median(result[key] for result in results) * 1000
+                       for key in ("package", "import", "ready", "exit")]
+            print(f"{variant:8} " + " ".join(f"{value:8.1f}" for value in medians))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,262 @@
+"""
+Local stand-in for the Blackbox server: the websocket gateway plus the REST
+routes Caller uses, on one aiohttp app.
+
+The gateway does the HELLO / identify / READY handshake, answers heartbeats
+and then replays a list of dispatch frames, as fast as possible or at a
+fixed rate. Connections asking for ?compress=zlib-stream get every frame
+through one zlib stream, otherwise permessage-deflate is negotiated when
+the client offers it. Frames can come from payloads.py or from a capture made with
+Recorder against a real server:
+
+    recorder = Recorder("frames.jsonl")
+    recorder.attach(client)
+    client.run()
+    ...
+    server = FakeServer(load_frames("frames.jsonl"), rate=500)
+    await server.start()
+    client = Client(token="token", transport=Transport(endpoint=server.endpoint))
+"""
+import asyncio
+import json
+import time
+import zlib
+from typing import Dict, List, Optional
+
+from aiohttp import WSMsgType, web
+
+import payloads
+
+GUILDS = 10
+
+
+def load_frames(path: str) -> List[str]:
+    """
+    Dispatch frames of a capture, one json frame per line, in the order they were received.
+    """
+    frames = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            # the handshake is done by the fake server, only replay dispatches
+            if line and json.loads(line)["op"] == 0x0:
+                frames.append(line)
+    return frames
+
+
+class Recorder:
+    """
+    Appends every gateway frame a client receives to a file, one per line.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.frames = 0
+
+    def attach(self, client) -> None:
+        process = client._process
+        f = open(self.path, "a")
+        client.tasks.add_shutdown_hook(self._closer(f))
+
+        async def recording_process(message):
+            f.write((message.decode() if isinstance(message, bytes) else message) + "\n")
+            self.frames += 1
+            await process(message)
+
+        client._process = recording_process
+
+    @staticmethod
+    def _closer(f):
+        async def close():
+            f.close()
+        return close
+
+
+class FakeServer:
+    """
+    Args:
+        frames: dispatch frames (json text) replayed after READY on every connection
+        rate: frames per second, None sends them as fast as the socket takes them
+        heartbeat_interval: milliseconds, sent in HELLO
+        ack_heartbeats: answer heartbeats with an ACK, can be switched while running
+        close_after_replay: close the connection once every frame was sent
+        file_size: bytes served for every /files download
+        port: 0 picks a free port
+    """
+
+    def __init__(self, frames: Optional[List[str]] = None, *, rate: Optional[float] = None, heartbeat_interval: int = 40000, ack_heartbeats: bool = True, close_after_replay: bool = False, file_size: int = 1024 * 1024, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.frames = frames or []
+        self.rate = rate
+        self.heartbeat_interval = heartbeat_interval
+        self.ack_heartbeats = ack_heartbeats
+        self.heartbeats = 0
+        self.close_after_replay = close_after_replay
+        self.file_size = file_size
+        # (field, filename, bytes) of every multipart file received
+        self.uploads: List[tuple] = []
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.connections = 0
+        # data of every identify frame received, in order
+        self.identifies: List[dict] = []
+        self._sessions: set = set()
+        self.frames_sent = 0
+        # payload id -> perf_counter when its frame was sent, for latency measurements
+        self.sent_at: Dict[str, float] = {}
+        self.replayed = asyncio.Event()
+        self._ids = [_payload_id(frame) for frame in self.frames]
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def endpoint(self) -> str:
+        """
+        Value for Transport(endpoint=...).
+        """
+        return f"{self.host}:{self.port}/api"
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/api/ws/", self._gateway)
+        app.router.add_get("/api/users/@me/guilds", self._json(lambda request: {
+            "guilds": [payloads.guild(index) for index in range(GUILDS)],
+            "dms": [],
+        }))
+        app.router.add_get("/api/users/@me", self._json(lambda request: payloads.user(0)))
+        app.router.add_get("/api/users/{user_id}", self._json(lambda request: payloads.user(int(request.match_info["user_id"]) % 100000)))
+        app.router.add_get("/api/guilds/{guild_id}", self._json(lambda request: payloads.guild(int(request.match_info["guild_id"]))))
+        app.router.add_get("/api/guilds/{guild_id}/members", self._json(lambda request: [payloads.user(index) for index in range(50)]))
+        app.router.add_get("/api/guilds/{guild_id}/msgs", self._json(self._messages))
+        app.router.add_get("/api/guilds/{guild_id}/invites", self._json(lambda request: []))
+        app.router.add_get("/api/files/{kind}/{file_id}", self._file)
+        app.router.add_route("*", "/api/{tail:.*}", self._ok)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if self.port == 0:
+            self.port = self._runner.addresses[0][1]
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "FakeServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    def _json(self, build):
+        async def handler(request):
+            self.requests += 1
+            return web.json_response(build(request))
+        return handler
+
+    async def _ok(self, request):
+        self.requests += 1
+        if request.content_type.startswith("multipart/"):
+            # read part by part like a real server would, never the whole body at once
+            reader = await request.multipart()
+            async for part in reader:
+                size = 0
+                while chunk := await part.read_chunk():
+                    size += len(chunk)
+                if part.filename is not None:
+                    self.uploads.append((part.name, part.filename, size))
+        else:
+            await request.read()
+        return web.Response(status=200)
+
+    async def _file(self, request):
+        self.requests += 1
+        response = web.StreamResponse(headers={"Content-Type": "application/octet-stream"})
+        response.content_length = self.file_size
+        await response.prepare(request)
+        chunk = b"\0" * 65536
+        remaining = self.file_size
+        while remaining > 0:
+            await response.write(chunk[:remaining])
+            remaining -= len(chunk)
+        await response.write_eof()
+        return response
+
+    def _messages(self, request):
+        limit = int(request.query.get("limit") or 50)
+        before = int(request.query.get("time") or 1700000100000)
+        # newest first, one message per millisecond before `time`
+        messages = []
+        for index in range(limit):
+            msg = payloads.message_create(index, mentions=0, attachments=0)
+            msg["guildId"] = request.match_info["guild_id"]
+            msg["created"] = before - 1 - index
+            msg["id"] = str(msg["created"])
+            messages.append(msg)
+        return messages
+
+    async def _gateway(self, request):
+        websocket = web.WebSocketResponse()
+        await websocket.prepare(request)
+        self.connections += 1
+        send = self._sender(websocket, request.query.get("compress") == "zlib-stream")
+        await send(json.dumps({"op": 0x2, "data": {"heartbeatInterval": self.heartbeat_interval}, "event": ""}))
+        replay = None
+        try:
+            async for message in websocket:
+                if message.type != WSMsgType.TEXT:
+                    break
+                frame = json.loads(message.data)
+                op = frame["op"]
+                if op == 0x1:  # identify
+                    identify = frame["data"]
+                    self.identifies.append(identify)
+                    # a known session id resumes that session, anything else starts a new one
+                    session_id = identify.get("sessionId")
+                    if session_id not in self._sessions:
+                        session_id = f"session{self.connections}"
+                        self._sessions.add(session_id)
+                    await send(json.dumps({"op": 0x3, "data": {"sessionId": session_id}, "event": ""}))
+                    replay = asyncio.ensure_future(self._replay(websocket, send))
+                elif op == 0x9:  # heartbeat
+                    self.heartbeats += 1
+                    if self.ack_heartbeats:
+                        await send(json.dumps({"op": 0xa, "data": None, "event": ""}))
+        finally:
+            if replay is not None:
+                replay.cancel()
+        return websocket
+
+    @staticmethod
+    def _sender(websocket, zlib_stream):
+        if not zlib_stream:
+            return websocket.send_str
+        # one compressor for the whole connection, each message ends with a sync flush
+        compressor = zlib.compressobj()
+
+        async def send(frame):
+            await websocket.send_bytes(compressor.compress(frame.encode()) + compressor.flush(zlib.Z_SYNC_FLUSH))
+        return send
+
+    async def _replay(self, websocket, send) -> None:
+        interval = 1 / self.rate if self.rate else 0
+        start = time.perf_counter()
+        for index, (frame, payload_id) in enumerate(zip(self.frames, self._ids)):
+            if interval:
+                # pace against the start time so slow sends don't add up
+                delay = start + index * interval - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if payload_id is not None:
+                self.sent_at[payload_id] = time.perf_counter()
+            await send(frame)
+            self.frames_sent += 1
+        self.replayed.set()
+        if self.close_after_replay:
+            await websocket.close()
+
+
+def _payload_id(frame: str) -> Optional[str]:
+    data = json.loads(frame).get("data")
+    return data.get("id") if isinstance(data, dict) else None
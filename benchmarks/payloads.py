@@ -0,0 +1,54 @@
+"""
+Synthetic gateway payloads shaped like what the server sends.
+"""
+import random
+
+_rng = random.Random(0)
+
+
+def user(index: int) -> dict:
+    return {
+        "id": str(100000 + index),
+        "name": f"user{index}",
+        "imageId": str(900000 + index),
+        "flags": 0,
+    }
+
+
+def guild(index: int) -> dict:
+    return {
+        "id": str(index),
+        "name": f"guild{index}",
+        "imageId": str(800000 + index),
+        "ownerId": str(100000 + index),
+        "dm": False,
+        "saveChat": True,
+        "unread": {"msgId": "0", "count": 0, "time": 0, "mentions": 0},
+    }
+
+
+def message_create(index: int, *, mentions: int = 2, attachments: int = 1) -> dict:
+    return {
+        "id": str(5000000 + index),
+        "guildId": str(_rng.randrange(10)),
+        "content": f"message number {index} with some text in it",
+        "author": user(index % 500),
+        "created": 1700000000000 + index,
+        "modified": 0,
+        "msgSaved": True,
+        "requestId": "",
+        "mentionsEveryone": False,
+        "mentions": [user(index + n) for n in range(mentions)],
+        "attachments": [
+            {"id": str(700000 + index + n), "filename": f"file{n}.png", "type": "image/png"}
+            for n in range(attachments)
+        ],
+    }
+
+
+def frame(event: str, data: dict, op: int = 0x0) -> dict:
+    return {"op": op, "data": data, "event": event}
+
+
+def message_frames(count: int, **kwargs) -> list:
+    return [frame("MESSAGE_CREATE", message_create(index, **kwargs)) for index in range(count)]
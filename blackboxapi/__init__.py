@@ -1 +1,14 @@
-from .core import *
\ No newline at end of file
+from importlib import import_module
+
+# core pulls in the whole client, the names are looked up there on first use
+# so importing the package stays cheap
+
+
+def __getattr__(name):
+    core = import_module(".core", __name__)
+    if name == "__all__":
+        return [key for key in vars(core) if not key.startswith("_")]
+    try:
+        return getattr(core, name)
+    except AttributeError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
@@ -0,0 +1,61 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Iterable, Iterator, List, Optional
+
+
+class BulkResult:
+    __slots__ = ("id", "ok", "error")
+
+    def __init__(self, id: str, ok: bool, error: Optional[BaseException]) -> None:
+        self.id = id
+        self.ok = ok
+        self.error = error
+
+    def __repr__(self) -> str:
+        return f"<BulkResult id={self.id} ok={self.ok} error={self.error!r}>"
+
+
+class BulkReport:
+    """
+    Result of every item of a bulk call, in the order the ids were given.
+    """
+
+    def __init__(self, results: List[BulkResult]) -> None:
+        self.results = results
+
+    def __iter__(self) -> Iterator[BulkResult]:
+        return iter(self.results)
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    @property
+    def succeeded(self) -> List[str]:
+        return [result.id for result in self.results if result.ok]
+
+    @property
+    def failed(self) -> List[BulkResult]:
+        return [result for result in self.results if not result.ok]
+
+    def __repr__(self) -> str:
+        return f"<BulkReport ok={len(self.succeeded)} failed={len(self.failed)}>"
+
+
+async def run_bulk(call: Callable[[str], Awaitable[Any]], ids: Iterable[str], /, *, concurrency: int = 10) -> BulkReport:
+    """
+    Run `call(id)` for every id with at most `concurrency` running at once.
+
+    Rate limits and transient failures are retried by Caller and its retry
+    policy, whatever still fails is recorded in the report instead of
+    stopping the batch.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(id):
+        async with semaphore:
+            try:
+                await call(id)
+            except Exception as e:
+                return BulkResult(id, False, e)
+            return BulkResult(id, True, None)
+
+    return BulkReport(list(await asyncio.gather(*(one(id) for id in ids))))
@@ -0,0 +1,232 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterator, List, Optional
+
+from events import Guild, Dm, User, Member
+
+# fields copied over when an update event arrives for something already cached
+# update payloads leave untouched fields as None so those are skipped
+GUILD_FIELDS = ("name", "image_id", "owner_id", "save_chat", "unread")
+USER_FIELDS = ("name", "image_id", "email", "flags", "options", "permissions")
+
+DEFAULT_LIMITS = {
+    "guilds": 1000,
+    "dms": 1000,
+    "users": 10000,
+    "members": 1000,  # number of guilds with a cached member list
+    "invites": 1000,  # number of guilds with a cached invite list
+}
+
+
+def _merge(cached, new, fields) -> None:
+    for field in fields:
+        value = getattr(new, field)
+        if value is not None:
+            setattr(cached, field, value)
+
+
+class LRUCache:
+    def __init__(self, max_size: Optional[int]) -> None:
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __iter__(self) -> Iterator:
+        return iter(self._data)
+
+    def values(self) -> List[Any]:
+        return list(self._data.values())
+
+    def get(self, key: Hashable) -> Any:
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key: Hashable) -> Any:
+        # lookup without touching counters or recency, used by event updates
+        return self._data.get(key)
+
+    def set(self, key: Hashable, value: Any) -> bool:
+        """
+        Store a value, evicting the least recently used entry if full.
+
+        Returns:
+            True if something was evicted
+        """
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if self.max_size is not None and len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+            return True
+        return False
+
+    def pop(self, key: Hashable) -> Any:
+        return self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class State:
+    """
+    In-memory cache of guilds, dms, users, members and invites.
+
+    Filled from REST responses and kept up to date by gateway events.
+    Objects returned from the cache are shared, do not mutate them.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Optional[int]]] = None) -> None:
+        limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.guilds = LRUCache(limits["guilds"])
+        self.dms = LRUCache(limits["dms"])
+        self.users = LRUCache(limits["users"])
+        # guild id -> {user id: User}
+        self.members = LRUCache(limits["members"])
+        # guild id -> [invite]
+        self.invites = LRUCache(limits["invites"])
+        # set once the full guild list was fetched, cleared if anything gets evicted
+        self.guilds_complete = False
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            "guilds": self.guilds.stats(),
+            "dms": self.dms.stats(),
+            "users": self.users.stats(),
+            "members": self.members.stats(),
+            "invites": self.invites.stats(),
+        }
+
+    def clear(self) -> None:
+        for cache in (self.guilds, self.dms, self.users, self.members, self.invites):
+            cache.clear()
+        self.guilds_complete = False
+
+    # filling from rest
+
+    def get_guild_list(self) -> Optional[Dict[str, List]]:
+        if not self.guilds_complete:
+            self.guilds.misses += 1
+            return None
+        self.guilds.hits += 1
+        return {"guilds": self.guilds.values(), "dms": self.dms.values()}
+
+    def set_guild_list(self, guilds: List[Guild], dms: List[Dm]) -> None:
+        self.guilds.clear()
+        self.dms.clear()
+        evicted = False
+        for guild in guilds:
+            evicted |= self.guilds.set(guild.id, guild)
+        for dm in dms:
+            evicted |= self.dms.set(dm.id, dm)
+            self.store_user(dm.user_info)
+        self.guilds_complete = not evicted
+
+    def store_guild(self, guild: Guild) -> None:
+        if self.guilds.set(guild.id, guild):
+            self.guilds_complete = False
+
+    def store_user(self, user: User) -> User:
+        cached = self.users.peek(user.id)
+        if cached is not None:
+            _merge(cached, user, USER_FIELDS)
+            return cached
+        self.users.set(user.id, user)
+        return user
+
+    def set_members(self, guild_id: str, users: List[User]) -> None:
+        self.members.set(guild_id, {user.id: self.store_user(user) for user in users})
+
+    def get_members(self, guild_id: str) -> Optional[List[User]]:
+        members = self.members.get(guild_id)
+        if members is None:
+            return None
+        return list(members.values())
+
+    def set_invites(self, guild_id: str, invites: List[str]) -> None:
+        self.invites.set(guild_id, list(invites))
+
+    def get_invites(self, guild_id: str) -> Optional[List[str]]:
+        invites = self.invites.get(guild_id)
+        if invites is None:
+            return None
+        return list(invites)
+
+    # gateway events
+
+    # events update() looks at, they are decoded even when no handler wants them
+    EVENTS = frozenset({
+        "guild_create", "guild_update", "guild_delete", "dm_create", "dm_delete",
+        "member_add", "member_remove", "member_ban_add", "member_ban_remove",
+        "member_admin_add", "member_admin_remove", "invite_create", "invite_delete",
+        "user_info_update", "user_friend_add", "user_friend_remove",
+        "user_friend_request_add", "user_friend_request_remove",
+    })
+
+    def update(self, event: str, data: Any) -> None:
+        match event:
+            case "guild_create":
+                if self.guilds_complete or data.id in self.guilds:
+                    self.store_guild(data)
+            case "guild_update":
+                cached = self.guilds.peek(data.id)
+                if cached is not None:
+                    _merge(cached, data, GUILD_FIELDS)
+            case "guild_delete":
+                self.guilds.pop(data.id)
+                self.members.pop(data.id)
+                self.invites.pop(data.id)
+            case "dm_create":
+                if self.guilds_complete:
+                    if self.dms.set(data.id, data):
+                        self.guilds_complete = False
+                self.store_user(data.user_info)
+            case "dm_delete":
+                self.dms.pop(data.id)
+            case "member_add":
+                self._member_add(data)
+            case "member_remove" | "member_ban_add":
+                members = self.members.peek(data.guild_id)
+                if members is not None:
+                    members.pop(data.user_info.id, None)
+            case "member_admin_add" | "member_admin_remove" | "member_ban_remove":
+                # these do not change who is in the guild, just refresh the user
+                self.store_user(data.user_info)
+            case "invite_create":
+                invites = self.invites.peek(data.guild_id)
+                if invites is not None and data.invite not in invites:
+                    invites.append(data.invite)
+            case "invite_delete":
+                invites = self.invites.peek(data.guild_id)
+                if invites is not None and data.invite in invites:
+                    invites.remove(data.invite)
+            case "user_info_update" | "user_friend_add" | "user_friend_remove" \
+                    | "user_friend_request_add" | "user_friend_request_remove":
+                self.store_user(data)
+
+    def _member_add(self, data: Member) -> None:
+        user = self.store_user(data.user_info)
+        members = self.members.peek(data.guild_id)
+        if members is not None:
+            members[user.id] = user
@@ -0,0 +1,216 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional
+
+from core import Client
+from retry import CLOSED
+from runner import run_main
+from transport import Transport
+
+if TYPE_CHECKING:
+    import aiohttp
+
+
+class Cluster:
+    """
+    Runs many clients on one event loop sharing one aiohttp connection pool.
+
+    REST calls of every client without a session of its own go through the
+    session built from `transport`, so pool size, timeouts and the unix
+    socket come from the cluster. Each client still uses the endpoint and
+    scheme of its own transport for urls and the gateway. A client whose
+    transport sets different session options is rejected instead of having
+    them silently ignored.
+
+    Example:
+        cluster = Cluster([Client(token=token) for token in tokens])
+        cluster.run()
+    """
+
+    def __init__(self, clients: Iterable[Client] = (), *, transport: Optional[Transport] = None) -> None:
+        # settings for the shared session, only the endpoint and scheme come from each client
+        self.transport = transport if transport is not None else Transport()
+        self.clients: List[Client] = []
+        for client in clients:
+            self._check(client)
+            self.clients.append(client)
+        self.session: Optional["aiohttp.ClientSession"] = None
+        self.started_at: Optional[float] = None
+        self._runners: List[asyncio.Task] = []
+
+    def add(self, client: Client) -> None:
+        self._check(client)
+        self.clients.append(client)
+        if self.session is not None:
+            self._start_client(client)
+
+    def _check(self, client: Client) -> None:
+        if client.caller.session is not None:
+            return  # keeps its own session
+        options = client.caller.transport.session_options()
+        expected = self.transport.session_options()
+        if options != expected:
+            different = ", ".join(key for key in options if options[key] != expected[key])
+            raise ValueError(f"Client transport sets {different} differently from the cluster transport, "
+                             f"REST calls use the cluster's shared session")
+
+    def _start_client(self, client: Client) -> None:
+        if client.caller.session is None:
+            client.caller.use_session(self.session)
+        self._runners.append(asyncio.create_task(client.start(), name="cluster_client"))
+
+    async def start(self) -> None:
+        """
+        Start every client and wait until all of them stopped.
+        """
+        self.session = self.transport.create_session()
+        self.started_at = time.monotonic()
+        try:
+            for client in self.clients:
+                self._start_client(client)
+            # clients added while running append to _runners, keep waiting until all are done
+            while any(not runner.done() for runner in self._runners):
+                await asyncio.gather(*self._runners, return_exceptions=True)
+        finally:
+            await self.session.close()
+            self.session = None
+
+    async def close(self, *, drain_timeout: Optional[float] = 5.0) -> None:
+        """
+        Close every client, giving running handlers `drain_timeout` seconds to finish.
+        """
+        await asyncio.gather(*(client.close(drain_timeout=drain_timeout) for client in self.clients),
+                             return_exceptions=True)
+        await asyncio.gather(*self._runners, return_exceptions=True)
+
+    def run(self, *, debug: bool = False, use_uvloop: Optional[bool] = None) -> None:
+        """
+        Run every client on a new event loop, SIGINT and SIGTERM close them.
+        """
+        run_main(self.start, shutdown=self.close, debug=debug, use_uvloop=use_uvloop)
+
+    def stats(self) -> Dict[str, Any]:
+        uptime = time.monotonic() - self.started_at if self.started_at is not None else 0.0
+        connected = sum(1 for client in self.clients if client.connection_stats.as_dict()["connected"])
+        latencies = [client.latency for client in self.clients if client.latency is not None]
+        frames = sum(client.frames_received for client in self.clients)
+        events = sum(client.events_received for client in self.clients)
+        return {
+            "clients": len(self.clients),
+            "connected": connected,
+            "reconnects": sum(client.connection_stats.reconnects for client in self.clients),
+            "frames": frames,
+            "events": events,
+            "events_per_second": events / uptime if uptime else 0.0,
+            "pending_tasks": sum(len(client.tasks) for client in self.clients),
+            "rest_retried": sum(client.caller.retry.retried for client in self.clients),
+            "open_circuits": sum(1 for client in self.clients for breaker in client.caller.retry.breakers.values()
+                                 if breaker.state != CLOSED),
+            "latency_avg": sum(latencies) / len(latencies) if latencies else None,
+            "latency_max": max(latencies) if latencies else None,
+            "uptime": uptime,
+        }
+
+
+def _run_worker(factory: Callable[[str], Client], tokens: List[str], stats_queue, index: int, interval: float) -> None:
+    cluster = Cluster(factory(token) for token in tokens)
+
+    async def report():
+        while True:
+            await asyncio.sleep(interval)
+            stats_queue.put((index, cluster.stats()))
+
+    async def main():
+        reporter = asyncio.create_task(report())
+        try:
+            await cluster.start()
+        finally:
+            reporter.cancel()
+            stats_queue.put((index, cluster.stats()))
+
+    run_main(main, shutdown=cluster.close)
+
+
+class ProcessCluster:
+    """
+    Spreads clients over a pool of processes, each running a Cluster on its own loop.
+
+    Args:
+        factory: top level function building a Client from a token, it has to be picklable
+        tokens: one client is created per token
+        processes: number of processes, defaults to the number of cores
+        stats_interval: how often each process reports its stats in seconds
+    """
+
+    def __init__(self, factory: Callable[[str], Client], tokens: Iterable[str], *, processes: Optional[int] = None, stats_interval: float = 5.0) -> None:
+        tokens = list(tokens)
+        processes = min(processes or os.cpu_count() or 1, len(tokens)) or 1
+        self.factory = factory
+        self.chunks = [tokens[index::processes] for index in range(processes)]
+        self.stats_interval = stats_interval
+        self.processes: List[multiprocessing.Process] = []
+        self._stats_queue = multiprocessing.Queue()
+        self._stats: Dict[int, Dict[str, Any]] = {}
+
+    def start(self) -> None:
+        for index, chunk in enumerate(self.chunks):
+            process = multiprocessing.Process(target=_run_worker,
+                                              args=(self.factory, chunk, self._stats_queue, index, self.stats_interval),
+                                              name=f"blackbox_cluster_{index}")
+            process.start()
+            self.processes.append(process)
+
+    def stop(self, timeout: Optional[float] = 10.0) -> None:
+        """
+        Ask every process to close its clients and wait for them to exit.
+
+        Processes still running after `timeout` seconds in total are killed.
+        """
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()  # SIGTERM, handled as a clean shutdown in the worker
+        self._wait(timeout)
+        for process in self.processes:
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+    def join(self) -> None:
+        self._wait(None)
+
+    def _wait(self, timeout: Optional[float]) -> None:
+        # a worker cannot exit while stats it queued are unread, so the queue is drained while waiting
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            self._collect()
+            alive = [process for process in self.processes if process.is_alive()]
+            if not alive or (deadline is not None and time.monotonic() >= deadline):
+                break
+            alive[0].join(0.1)
+        self._collect()
+
+    def _collect(self) -> None:
+        while True:
+            try:
+                index, stats = self._stats_queue.get_nowait()
+            except queue.Empty:
+                return
+            self._stats[index] = stats
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Latest stats reported by each process added together.
+        """
+        self._collect()
+        total: Dict[str, Any] = {
+            "processes": len(self.processes),
+            "alive": sum(1 for process in self.processes if process.is_alive()),
+        }
+        for stats in self._stats.values():
+            for key in ("clients", "connected", "reconnects", "frames", "events", "events_per_second", "pending_tasks",
+                        "rest_retried", "open_circuits"):
+                total[key] = total.get(key, 0) + stats[key]
+        return total
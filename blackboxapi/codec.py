@@ -0,0 +1,72 @@
+import json
+from typing import Any, Callable, Optional, Union
+
+
+class Codec:
+    """
+    JSON encoder/decoder used for gateway frames and REST bodies.
+
+    `loads` accepts str or bytes, `dumps` returns bytes and `dumps_str`
+    returns str for sending text websocket frames.
+    """
+
+    def __init__(self, name: str, loads: Callable[[Union[str, bytes]], Any], dumps: Callable[[Any], bytes]) -> None:
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+
+    def dumps_str(self, obj: Any) -> str:
+        return self.dumps(obj).decode()
+
+    def __repr__(self) -> str:
+        return f"<Codec {self.name}>"
+
+
+def _orjson_codec() -> Codec:
+    import orjson
+    return Codec("orjson", orjson.loads, orjson.dumps)
+
+
+def _msgspec_codec() -> Codec:
+    import msgspec
+    encoder = msgspec.json.Encoder()
+    decoder = msgspec.json.Decoder()
+    return Codec("msgspec", decoder.decode, encoder.encode)
+
+
+def _json_codec() -> Codec:
+    # separators match what the fast libraries emit
+    encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False)
+    return Codec("json", json.loads, lambda obj: encoder.encode(obj).encode())
+
+
+BACKENDS = {
+    "orjson": _orjson_codec,
+    "msgspec": _msgspec_codec,
+    "json": _json_codec,
+}
+
+
+def get_codec(name: Optional[str] = None) -> Codec:
+    """
+    Get a codec by name, or the fastest one installed if no name is given.
+
+    Raises:
+        ImportError: if the requested backend is not installed
+        ValueError: if the name is not a known backend
+    """
+    if name is not None:
+        try:
+            backend = BACKENDS[name]
+        except KeyError:
+            raise ValueError(f"Unknown codec {name}, expected one of {list(BACKENDS)}") from None
+        return backend()
+    for backend in BACKENDS.values():
+        try:
+            return backend()
+        except ImportError:
+            continue
+    raise RuntimeError("no json backend available")  # unreachable, json is stdlib
+
+
+default_codec = get_codec()
@@ -0,0 +1,348 @@
+import asyncio
+import inspect
+import time
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from events import Msg
+from log import dispatch_log
+
+USER = "user"
+GUILD = "guild"
+GLOBAL = "global"
+
+COOLDOWN_SCOPES = (USER, GUILD, GLOBAL)
+
+
+class CommandError(Exception):
+    """
+    Base class for errors raised while routing a command, passed to the router's error handler.
+    """
+
+
+class BadArgument(CommandError):
+    pass
+
+
+class CommandOnCooldown(CommandError):
+    def __init__(self, command: str, retry_after: float) -> None:
+        super().__init__(f"{command} is on cooldown, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def _to_bool(argument: str) -> bool:
+    lowered = argument.lower()
+    if lowered in ("yes", "y", "true", "t", "1", "on"):
+        return True
+    if lowered in ("no", "n", "false", "f", "0", "off"):
+        return False
+    raise ValueError(f"{argument!r} is not a boolean")
+
+
+# annotations with a converter of their own, anything else callable is called with the string
+CONVERTERS: Dict[Any, Callable[[str], Any]] = {
+    bool: _to_bool,
+}
+
+
+class Param:
+    __slots__ = ("name", "convert", "is_async", "default", "kind")
+
+    def __init__(self, name: str, convert: Optional[Callable[[str], Any]], default: Any, kind: Any) -> None:
+        self.name = name
+        self.convert = convert
+        # coroutine converters (such as a user lookup) are awaited
+        self.is_async = asyncio.iscoroutinefunction(convert)
+        self.default = default
+        self.kind = kind
+
+
+def _convert(param: Param, raw: str) -> Any:
+    if param.convert is None:
+        return raw
+    try:
+        return param.convert(raw)
+    except CommandError:
+        raise
+    except Exception as e:
+        raise BadArgument(f"bad value for {param.name}: {raw!r}") from e
+
+
+class Context:
+    """
+    One command invocation, passed as the first argument to commands and middleware.
+    """
+    __slots__ = ("client", "msg", "command", "prefix", "invoked_with", "arguments")
+
+    def __init__(self, client, msg: Msg, command: "Command", prefix: str, invoked_with: str, arguments: str) -> None:
+        self.client = client
+        self.msg = msg
+        self.command = command
+        self.prefix = prefix
+        self.invoked_with = invoked_with
+        # everything after the command name, unparsed
+        self.arguments = arguments
+
+    @property
+    def guild_id(self) -> str:
+        return self.msg.guild_id
+
+    @property
+    def author(self):
+        return self.msg.author
+
+    async def reply(self, message: str) -> None:
+        await self.client.send_message(self.msg.guild_id, message)
+
+
+class Command:
+    """
+    A registered command, its arguments are converted from the callback signature.
+
+    Positional parameters take one word each, a keyword only parameter takes
+    the rest of the message and *args takes every remaining word.
+
+    Args:
+        concurrency: max invocations running at once, later ones wait
+        cooldown: (uses, seconds), at most `uses` invocations per `seconds` for each key of `cooldown_scope`
+        cooldown_scope: "user", "guild" or "global"
+    """
+
+    def __init__(self, callback: Callable[..., Awaitable[Any]], *, name: str, aliases: Tuple[str, ...] = (),
+                 concurrency: Optional[int] = None, cooldown: Optional[Tuple[int, float]] = None,
+                 cooldown_scope: str = USER) -> None:
+        if not asyncio.iscoroutinefunction(callback):
+            raise TypeError("Command must be a coroutine function")
+        if cooldown_scope not in COOLDOWN_SCOPES:
+            raise ValueError(f"cooldown_scope must be one of {COOLDOWN_SCOPES}")
+        self.callback = callback
+        self.name = name
+        self.aliases = aliases
+        self.concurrency = concurrency
+        self.cooldown = cooldown
+        self.cooldown_scope = cooldown_scope
+        self.invocations = 0
+        self.params = self._parse_signature(callback)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # cooldown key -> (window start, uses in window)
+        self._windows: Dict[Optional[str], Tuple[float, int]] = {}
+
+    @staticmethod
+    def _parse_signature(callback) -> List[Param]:
+        params = []
+        # the first parameter is the context
+        for parameter in list(inspect.signature(callback).parameters.values())[1:]:
+            annotation = parameter.annotation
+            if annotation is inspect.Parameter.empty or annotation is str:
+                convert = None
+            else:
+                convert = CONVERTERS.get(annotation, annotation)
+            params.append(Param(parameter.name, convert, parameter.default, parameter.kind))
+        return params
+
+    def _check_cooldown(self, ctx: Context) -> None:
+        uses, per = self.cooldown
+        if self.cooldown_scope == USER:
+            key = ctx.msg.author.id if ctx.msg.author is not None else None
+        elif self.cooldown_scope == GUILD:
+            key = ctx.msg.guild_id
+        else:
+            key = None
+        now = time.monotonic()
+        start, count = self._windows.get(key, (now, 0))
+        if now - start >= per:
+            start, count = now, 0
+        if count >= uses:
+            raise CommandOnCooldown(self.name, per - (now - start))
+        self._windows[key] = (start, count + 1)
+
+    async def _convert(self, ctx: Context) -> Tuple[List[Any], Dict[str, Any]]:
+        args: List[Any] = []
+        kwargs: Dict[str, Any] = {}
+        rest = ctx.arguments
+        for param in self.params:
+            if param.kind is inspect.Parameter.KEYWORD_ONLY:
+                raw = rest.strip()
+                rest = ""
+                if not raw:
+                    if param.default is inspect.Parameter.empty:
+                        raise BadArgument(f"missing argument {param.name}")
+                    kwargs[param.name] = param.default
+                    continue
+                kwargs[param.name] = await self._convert_async(param, raw) if param.is_async else _convert(param, raw)
+                continue
+            if param.kind is inspect.Parameter.VAR_POSITIONAL:
+                for raw in rest.split():
+                    args.append(await self._convert_async(param, raw) if param.is_async else _convert(param, raw))
+                rest = ""
+                continue
+            raw, _, rest = rest.lstrip().partition(" ")
+            if not raw:
+                if param.default is inspect.Parameter.empty:
+                    raise BadArgument(f"missing argument {param.name}")
+                args.append(param.default)
+                continue
+            args.append(await self._convert_async(param, raw) if param.is_async else _convert(param, raw))
+        return args, kwargs
+
+    @staticmethod
+    async def _convert_async(param: Param, raw: str) -> Any:
+        try:
+            return await param.convert(raw)
+        except CommandError:
+            raise
+        except Exception as e:
+            raise BadArgument(f"bad value for {param.name}: {raw!r}") from e
+
+    async def invoke(self, ctx: Context) -> None:
+        if self.cooldown is not None:
+            self._check_cooldown(ctx)
+        args, kwargs = await self._convert(ctx) if self.params else ((), {})
+        self.invocations += 1
+        if self.concurrency is None:
+            await self.callback(ctx, *args, **kwargs)
+            return
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            await self.callback(ctx, *args, **kwargs)
+
+    def __repr__(self) -> str:
+        return f"<Command {self.name}>"
+
+
+class Router:
+    """
+    Routes message_create events to registered commands.
+
+    Each message is parsed once: anything not starting with the prefix is
+    dropped right away, otherwise the first word is looked up in a dict of
+    command names and aliases. Middleware run around every invocation in the
+    order they were added, as `await middleware(ctx, call_next)`.
+
+    Example:
+        router = Router(prefix="!")
+
+        @router.command(aliases=("p",), cooldown=(1, 5.0))
+        async def ping(ctx):
+            await ctx.reply("pong")
+
+        @router.command()
+        async def ban(ctx, user_id: str, days: int = 0, *, reason: str = ""):
+            ...
+
+        router.attach(client)
+
+    Args:
+        prefix: one prefix or a tuple of them
+        ignore_self: drop messages sent by the logged in user
+        case_insensitive: match command names in any case
+    """
+
+    def __init__(self, prefix: Union[str, Tuple[str, ...]] = "!", *, ignore_self: bool = True, case_insensitive: bool = False) -> None:
+        self.prefixes = (prefix,) if isinstance(prefix, str) else tuple(prefix)
+        self.ignore_self = ignore_self
+        self.case_insensitive = case_insensitive
+        self.commands: Dict[str, Command] = {}
+        self.middleware_stack: List[Callable[[Context, Callable[[], Awaitable[None]]], Awaitable[None]]] = []
+        self.error_handler: Optional[Callable[[Context, Exception], Awaitable[None]]] = None
+        self.unknown = 0  # messages with the prefix that matched no command
+        self._index: Dict[str, Command] = {}
+        # id of the logged in user of every attached client
+        self._self_ids: Dict[Any, str] = {}
+
+    def command(self, name: Optional[str] = None, *, aliases: Tuple[str, ...] = (), concurrency: Optional[int] = None,
+                cooldown: Optional[Tuple[int, float]] = None, cooldown_scope: str = USER):
+        def decorator(callback):
+            self.add_command(Command(callback, name=name or callback.__name__, aliases=aliases,
+                                     concurrency=concurrency, cooldown=cooldown, cooldown_scope=cooldown_scope))
+            return callback
+        return decorator
+
+    def add_command(self, command: Command) -> None:
+        names = [command.name, *command.aliases]
+        if self.case_insensitive:
+            names = [name.lower() for name in names]
+        for name in names:
+            if name in self._index:
+                raise ValueError(f"Command {name} is already registered")
+            if not name or " " in name:
+                raise ValueError(f"Invalid command name {name!r}")
+        self.commands[command.name] = command
+        for name in names:
+            self._index[name] = command
+
+    def middleware(self, func):
+        if not asyncio.iscoroutinefunction(func):
+            raise TypeError("Middleware must be a coroutine function")
+        self.middleware_stack.append(func)
+        return func
+
+    def error(self, func):
+        """
+        Register the handler called with (ctx, error) when a command fails.
+        """
+        self.error_handler = func
+        return func
+
+    def attach(self, client) -> None:
+        """
+        Register the router as the client's message_create handler.
+        """
+        router = self
+
+        async def message_create(client, msg: Msg) -> None:
+            await router.dispatch(client, msg)
+
+        client.event(message_create)
+
+    def find(self, content: str) -> Optional[Tuple[Command, str, str, str]]:
+        """
+        Look up the command a message invokes.
+
+        Returns:
+            (command, prefix, name used, rest of the message), or None
+        """
+        if not content.startswith(self.prefixes):
+            return None
+        for prefix in self.prefixes:
+            if content.startswith(prefix):
+                break
+        name, _, arguments = content[len(prefix):].partition(" ")
+        command = self._index.get(name.lower() if self.case_insensitive else name)
+        if command is None:
+            self.unknown += 1
+            return None
+        return command, prefix, name, arguments
+
+    async def dispatch(self, client, msg: Msg) -> None:
+        content = msg.content
+        if not content or not content.startswith(self.prefixes):
+            return
+        if self.ignore_self:
+            try:
+                self_id = self._self_ids[client]
+            except KeyError:
+                self_id = self._self_ids[client] = (await client.get_self()).id
+            if msg.author is not None and msg.author.id == self_id:
+                return
+        found = self.find(content)
+        if found is None:
+            return
+        command, prefix, name, arguments = found
+        ctx = Context(client, msg, command, prefix, name, arguments)
+        try:
+            if self.middleware_stack:
+                call = partial(command.invoke, ctx)
+                for middleware in reversed(self.middleware_stack):
+                    call = partial(middleware, ctx, call)
+                await call()
+            else:
+                await command.invoke(ctx)
+        except Exception as e:
+            if self.error_handler is not None:
+                await self.error_handler(ctx, e)
+            elif isinstance(e, CommandError):
+                dispatch_log.info("Command %s failed: %s", command.name, e, extra={"event": "command"})
+            else:
+                dispatch_log.exception("Error in command %s", command.name, extra={"event": "command"})
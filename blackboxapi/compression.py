@@ -0,0 +1,79 @@
+import time
+import zlib
+from typing import Dict, Optional
+
+DEFLATE = "deflate"
+ZLIB_STREAM = "zlib-stream"
+
+MODES = (None, DEFLATE, ZLIB_STREAM)
+
+# every complete message of a zlib stream ends with an empty sync flush block
+ZLIB_SUFFIX = b"\x00\x00\xff\xff"
+
+
+class CompressionStats:
+    """
+    Byte counts and inflate time of zlib-stream connections.
+
+    With permessage-deflate the websocket library inflates the frames itself
+    and nothing is counted here.
+    """
+
+    def __init__(self) -> None:
+        self.frames = 0
+        self.compressed_bytes = 0
+        self.inflated_bytes = 0
+        self.inflate_time = 0.0  # cpu seconds spent in zlib
+
+    @property
+    def ratio(self) -> Optional[float]:
+        """
+        Inflated size over compressed size, None before the first compressed frame.
+        """
+        if not self.compressed_bytes:
+            return None
+        return self.inflated_bytes / self.compressed_bytes
+
+    def as_dict(self) -> Dict[str, Optional[float]]:
+        return {
+            "frames": self.frames,
+            "compressed_bytes": self.compressed_bytes,
+            "inflated_bytes": self.inflated_bytes,
+            "ratio": self.ratio,
+            "inflate_time": self.inflate_time,
+        }
+
+
+class ZlibStream:
+    """
+    Inflater for one zlib-stream connection.
+
+    The server compresses the whole connection as a single zlib stream, so
+    the decompressor has to live as long as the connection and frames have
+    to be fed in order. A message can span several websocket frames, it is
+    complete once the data ends with ZLIB_SUFFIX.
+    """
+
+    def __init__(self, stats: CompressionStats) -> None:
+        self.stats = stats
+        self._inflater = zlib.decompressobj()
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> Optional[bytes]:
+        """
+        Add a binary frame, returns the inflated json once a message is complete.
+        """
+        self.stats.compressed_bytes += len(data)
+        if not data.endswith(ZLIB_SUFFIX):
+            self._buffer += data
+            return None
+        if self._buffer:
+            self._buffer += data
+            data = bytes(self._buffer)
+            self._buffer.clear()
+        start = time.thread_time()
+        message = self._inflater.decompress(data)
+        self.stats.inflate_time += time.thread_time() - start
+        self.stats.frames += 1
+        self.stats.inflated_bytes += len(message)
+        return message
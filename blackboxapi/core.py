@@ -1,138 +1,477 @@
 import asyncio
-import json
-from websockets.client import connect
-from traceback import print_exc
-from typing import Dict, Union, Optional, List
+import logging
+import zlib
+from functools import partial
+from typing import TYPE_CHECKING, AsyncIterator, Dict, FrozenSet, Iterable, Union, Optional, List, Tuple
 
 
-from helpers import Controller, Caller, Tasks, ENDPOINT_URL
+from helpers import Controller, Caller, Tasks
 from events import Guild, Dm, User, Msg
+from cache import State
+from dispatcher import Dispatcher
+from codec import Codec, default_codec
+import iterators
+from reconnect import Backoff, ConnectionStats
+from heartbeat import Heartbeat
+from transport import Transport
+from bulk import BulkReport, run_bulk
+from outbound import SendQueue
+from log import gateway_log
+from metrics import Metrics, NULL_METRICS
+from decoder import FrameDecoder
+from compression import DEFLATE, MODES, ZLIB_STREAM, CompressionStats, ZlibStream
+from store import MessageStore
+from files import Transfers, Upload
+from runner import run_main
+
+if TYPE_CHECKING:
+    import aiohttp
 
 
 class Client(Controller):
-    def __init__(self, *, token: str) -> None:
+    def __init__(self, *, token: str, cache: bool = False, cache_limits: Optional[Dict[str, Optional[int]]] = None, dispatcher: Optional[Dispatcher] = None, codec: Optional[Codec] = None, session: Optional["aiohttp.ClientSession"] = None, transport: Optional[Transport] = None, reconnect: bool = True, backoff: Optional[Backoff] = None, heartbeat: Optional[Heartbeat] = None, send_queue: Optional[SendQueue] = None, metrics: Metrics = NULL_METRICS, decoder: Optional[FrameDecoder] = None, compression: Optional[str] = DEFLATE, subscribe: bool = False, message_store: Optional[MessageStore] = None) -> None:
+        if compression not in MODES:
+            raise ValueError(f"compression must be one of {MODES}")
         self.websocket = None
         self.loop = None
 
         self.token = token
         self.heartbeat_interval = 0
-        self.tasks = Tasks()
+        self.metrics = metrics
+        self.tasks = Tasks(metrics)
+
+        self.codec = codec if codec is not None else default_codec
+        self.caller = Caller(token, codec=self.codec, session=session, transport=transport, metrics=metrics)
+        # opt in entity cache, kept up to date by gateway events
+        self.state = State(cache_limits) if cache else None
+        # opt in message archive, serves get_messages and history pages it holds
+        self.message_store = message_store
+        # bounded worker pool for handlers, None runs every handler in its own task
+        self.dispatcher = dispatcher
+
+        self.reconnect = reconnect
+        self.backoff = backoff if backoff is not None else Backoff()
+        self.connection_stats = ConnectionStats()
+        self.heartbeat = heartbeat if heartbeat is not None else Heartbeat()
+        # queue_message goes through this, flushed when tasks are stopped
+        self.send_queue = send_queue if send_queue is not None else SendQueue()
+        self.send_queue.attach(self.caller, self.tasks)
+        # streamed attachment and image transfers, replace to change the limits
+        self.files = Transfers(self.caller)
+        # decodes frames on a pool when set, None decodes on the loop
+        self.decoder = decoder
+        # "deflate" negotiates permessage-deflate, "zlib-stream" asks the server
+        # to compress the whole connection as one stream, None sends plain text
+        self.compression = compression
+        self.compression_stats = CompressionStats()
+        self._inflater: Optional[ZlibStream] = None
+        # session id and last dispatch sequence, sent on identify to resume when the server supports it
+        self.session_id = None
+        self.sequence = None
+        self._closing = False
+        # set by close(), cuts the backoff between reconnects short
+        self._closed = asyncio.Event()
+        self._drain_timeout = None
+        self._ready = False
+        self._ping_task = None
+        self.frames_received = 0
+        self.events_received = 0
+        # dispatches without a handler, dropped before decoding unless the cache or the store need them
+        self.events_skipped = 0
+        # event -> (needs decoding, has a handler)
+        self._wanted: Dict[str, Tuple[bool, bool]] = {}
+        self._wanted_names: Optional[FrozenSet[str]] = None
+        # send the handled events in identify so the server can leave out the rest
+        self.subscribe = subscribe
+
+    def run(self, *, debug: bool = False, use_uvloop: Optional[bool] = None, drain_timeout: Optional[float] = 5.0) -> None:
+        """
+        Run the client on a new event loop until it is closed.
+
+        SIGINT and SIGTERM close the client, giving running handlers
+        `drain_timeout` seconds to finish, a second signal stops it right away.
 
-        self.caller = Caller(token)
+        Args:
+            debug: asyncio debug mode, slow, for finding blocking calls and unawaited coroutines
+            use_uvloop: run on uvloop, None uses it when it is installed
+        """
+        run_main(self.start, shutdown=partial(self.close, drain_timeout=drain_timeout), debug=debug, use_uvloop=use_uvloop)
 
-    def run(self) -> None:
+    async def start(self) -> None:
+        """
+        Connect and process events until closed, for running the client on an existing loop.
+        """
+        self.loop = asyncio.get_running_loop()
         self.caller._start_session()
-        self.loop = asyncio.get_event_loop()
-        self.loop.set_debug(True)
-        # TODO: suppress cancelled error
         try:
-            self.loop.run_until_complete(self._loop())
-        except asyncio.exceptions.CancelledError:
-            pass
+            await self._loop()
+        except asyncio.CancelledError:
+            # cancelled instead of closed, the connections still have to be released
+            await self.caller._stop_session()
+            raise
+
+    @property
+    def latency(self) -> Optional[float]:
+        """
+        Gateway round trip time of the last heartbeat in seconds, None before the first ACK.
+        """
+        return self.heartbeat.last
+
+    async def close(self, *, drain_timeout: Optional[float] = None) -> None:
+        """
+        Stop reconnecting and close the gateway connection.
+
+        Args:
+            drain_timeout: seconds running handlers get to finish before being cancelled
+        """
+        self._closing = True
+        self._drain_timeout = drain_timeout
+        self._closed.set()
+        if self.websocket is not None:
+            await self.websocket.close()
+
     async def _loop(self) -> None:
-        self.websocket = await connect(f"ws://{ENDPOINT_URL}/ws/", ping_interval=None)
-        while self.websocket.open:
+        # websockets is only imported once the client connects
+        from websockets.exceptions import InvalidHandshake
+        if self.dispatcher is not None:
+            self.dispatcher.start(self.tasks)
+        if self.decoder is not None:
+            self.decoder.start(self.codec)
+        attempt = 0
+        while not self._closing:
             try:
-                message = await self.websocket.recv()
-                print(message)
-                await self._process(message)
-            except Exception as e:
-                print("PRINTING ERROR")
-                print_exc() 
-        await self.tasks.stop_tasks()
+                self.websocket = await self._connect()
+            except (OSError, InvalidHandshake, asyncio.TimeoutError):
+                gateway_log.exception("Failed to connect to gateway")
+            else:
+                if self._closing:
+                    # close() ran while connecting and could not reach this socket
+                    await self.websocket.close()
+                    break
+                self.connection_stats.connected()
+                # the stream starts over on every connection
+                self._inflater = ZlibStream(self.compression_stats) if self.compression == ZLIB_STREAM else None
+                self.heartbeat.reset()
+                self._ready = False
+                if self.decoder is not None:
+                    await self._receive_decoded(self.websocket)
+                else:
+                    await self._receive(self.websocket)
+                # only reset the backoff once a connection made it to READY
+                if self._ready:
+                    attempt = 0
+                self._ready = False
+                if self.message_store is not None:
+                    self.message_store.connection_lost()
+            self.connection_stats.disconnected()
+            if self._ping_task is not None:
+                self._ping_task.cancel()
+                self._ping_task = None
+            if self._closing or not self.reconnect:
+                break
+            delay = self.backoff.delay(attempt)
+            attempt += 1
+            gateway_log.warning("Gateway disconnected, reconnecting in %.1fs", delay)
+            try:
+                await asyncio.wait_for(self._closed.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+        if self._drain_timeout and self.dispatcher is not None:
+            try:
+                await asyncio.wait_for(self.dispatcher.join(), self._drain_timeout)
+            except asyncio.TimeoutError:
+                pass
+        await self.tasks.stop_tasks(timeout=self._drain_timeout)
+        if self.decoder is not None:
+            self.decoder.stop()
         await self.caller._stop_session()
 
-    async def _ping_timer(self):
-        while self.websocket.open:
-            await asyncio.sleep((self.heartbeat_interval / 1000) // 4)
+    async def _connect(self):
+        from websockets.client import connect, unix_connect
+        transport = self.caller.transport
+        url = self.caller.gateway_url
+        if self.compression == ZLIB_STREAM:
+            url += "?compress=zlib-stream"
+        # the zlib stream is already compressed, deflating it again only costs cpu
+        compression = "deflate" if self.compression == DEFLATE else None
+        if transport.unix_socket is not None:
+            return await unix_connect(transport.unix_socket, url, ping_interval=None, compression=compression)
+        return await connect(url, ping_interval=None, compression=compression)
+
+    async def _receive(self, websocket) -> None:
+        from websockets.exceptions import ConnectionClosed
+        # recv keeps returning frames that arrived before a close, so run until it raises
+        while True:
+            try:
+                message = await websocket.recv()
+                if self._inflater is not None and type(message) is bytes:
+                    message = self._inflater.feed(message)
+                    if message is None:
+                        continue
+                if gateway_log.isEnabledFor(logging.DEBUG):
+                    gateway_log.debug("Received frame %s", message)
+                await self._process(message)
+            except ConnectionClosed:
+                break
+            except zlib.error:
+                # nothing after a corrupt block can be inflated, start a new stream
+                gateway_log.exception("Corrupt zlib stream, reconnecting")
+                await websocket.close()
+            except Exception:
+                gateway_log.exception("Error processing gateway frame")
+
+    async def _receive_decoded(self, websocket) -> None:
+        from websockets.exceptions import ConnectionClosed
+        # futures go through the queue in receive order, so frames are handled in
+        # order whichever worker finishes first, and a full queue stops the reads
+        queue: asyncio.Queue = asyncio.Queue(self.decoder.max_pending)
+        consumer = self.tasks.create_task(self._handle_decoded(queue), name="frame_decoder", background=True)
+        try:
+            while True:
+                try:
+                    message = await websocket.recv()
+                except ConnectionClosed:
+                    break
+                if self._inflater is not None and type(message) is bytes:
+                    # the stream has to be inflated in order, so this stays on the loop
+                    try:
+                        message = self._inflater.feed(message)
+                    except zlib.error:
+                        gateway_log.exception("Corrupt zlib stream, reconnecting")
+                        await websocket.close()
+                        continue
+                    if message is None:
+                        continue
+                if gateway_log.isEnabledFor(logging.DEBUG):
+                    gateway_log.debug("Received frame %s", message)
+                await queue.put(self.decoder.submit(message, self.wanted_events()))
+        except asyncio.CancelledError:
+            consumer.cancel()
+            raise
+        # frames read before the close are still handled
+        await queue.put(None)
+        await consumer
+
+    async def _handle_decoded(self, queue: asyncio.Queue) -> None:
+        while True:
+            future = await queue.get()
+            if future is None:
+                return
+            try:
+                await self._handle_frame(await future)
+            except Exception:
+                gateway_log.exception("Error processing gateway frame")
+
+    async def _ping_timer(self, websocket):
+        from websockets.exceptions import ConnectionClosed
+        while websocket.open:
+            await asyncio.sleep(self.heartbeat_interval / 1000 / 4)
+            if self.heartbeat.dead:
+                gateway_log.warning("No heartbeat ACK for %d heartbeats, reconnecting", self.heartbeat.missed,
+                                    extra={"latency": self.heartbeat.last})
+                # closing ends _receive and the supervisor reconnects
+                await websocket.close()
+                return
             ping_frame = {
                 "op": 0x9,
                 "data": None,
                 "event": ""
             }
-            send_data = json.dumps(ping_frame)
-            await self.websocket.send(send_data)
+            send_data = self.codec.dumps_str(ping_frame)
+            self.heartbeat.sent()
+            try:
+                await websocket.send(send_data)
+            except ConnectionClosed:
+                # closed while sleeping, the supervisor takes it from here
+                return
 
     async def _process(self, message):
-        data_frame: Dict[str, Union[str, Dict]] = json.loads(message)
+        await self._handle_frame(self.codec.loads(message))
+
+    async def _handle_frame(self, data_frame: Dict[str, Union[str, Dict]]):
+        self.frames_received += 1
         op: int = data_frame["op"]
+        if self.metrics.enabled:
+            self.metrics.inc("gateway_frames_total", op=str(op))
         data = data_frame["data"]
         event: str = data_frame["event"]
         match op:
             case 0x0:  # TYPE_DISPATCH
+                self.events_received += 1
+                seq = data_frame.get("seq")
+                if seq is not None:
+                    self.sequence = seq
                 await self._process_event(data, event)
             case 0x2:  # TYPE_HELLO
                 self.heartbeat_interval: int = data["heartbeatInterval"]
+                identify_data = {"token": self.token}
+                if self.session_id is not None:
+                    # ask the server to replay dispatches we missed while disconnected
+                    identify_data["sessionId"] = self.session_id
+                    identify_data["seq"] = self.sequence
+                if self.subscribe:
+                    identify_data["events"] = self.subscriptions()
                 identify_frame = {
                     "op": 0x1,
-                    "data":  {"token": self.token},
+                    "data":  identify_data,
                     "event": ""
                 }
-                send_data = json.dumps(identify_frame)
+                send_data = self.codec.dumps_str(identify_frame)
                 await self.websocket.send(send_data)
             case 0x3:  # TYPE_READY
-                self.tasks.create_task(self._ping_timer(), name="ping_timer")
-                self.tasks.create_task(self.on_ready(), name="on_ready")
+                session_id = data.get("sessionId") if isinstance(data, dict) else None
+                resumed = session_id is not None and session_id == self.session_id
+                if resumed:
+                    self.connection_stats.resumes += 1
+                self.session_id = session_id
+                self._ready = True
+                self._ping_task = self.tasks.create_task(self._ping_timer(self.websocket), name="ping_timer", background=True)
+                if not resumed:
+                    self.tasks.create_task(self.on_ready(), name="on_ready")
             case 0x8:
-                self.websocket.close()
-            case 0xa:
-                pass  # add thing for heart beat ack later
+                # server closed the session, start a new one on reconnect
+                self.session_id = None
+                await self.websocket.close()
+            case 0xa:  # TYPE_HEARTBEAT_ACK
+                self.heartbeat.ack()
     # connection shit
-    # TODO: make iterator function for retrieving guilds if user is in thousand of guilds
 
-    async def get_guilds(self) -> List[Guild]:
+    async def get_guilds(self) -> Dict[str, List[Union[Guild, Dm]]]:
+        if self.state is not None:
+            cached = self.state.get_guild_list()
+            if cached is not None:
+                return cached
         guild_list = await self.caller.get_guilds()
-        print(guild_list)
+        guilds = [Guild.decode(guild) for guild in guild_list["guilds"]]
+        for guild in guilds:
+            guild.dm = False
+        dms = [Dm.decode(dm) for dm in guild_list["dms"]]
+        if self.state is not None:
+            self.state.set_guild_list(guilds, dms)
         return {
-            "guilds": [Guild(**guild, dm=False) for guild in guild_list["guilds"]],
-            "dms": [
-                Dm(**dm) for dm in guild_list["dms"]
-            ]
+            "guilds": guilds,
+            "dms": dms
         }
     
     async def get_guild(self, guild_id : str, /) -> Guild:
-        guild = await self.caller.get_guild(guild_id)
-        return Guild(**guild)
+        if self.state is not None:
+            cached = self.state.guilds.get(guild_id)
+            if cached is not None:
+                return cached
+        guild = Guild.decode(await self.caller.get_guild(guild_id))
+        if self.state is not None:
+            self.state.store_guild(guild)
+        return guild
 
     async def get_friends(self) -> List[User]:
         users = await self.caller.get_friends()
-        return [User(**user) for user in users]
+        return [User.decode(user) for user in users]
 
     async def get_friend_requests(self) -> List[User]:
         users = await self.caller.get_friend_requests()
-        return [User(**user) for user in users]
+        return [User.decode(user) for user in users]
 
     async def get_messages(self, guild_id : str, time : int, limit : int, /) -> List[Msg]:
-        msgs = await self.caller.get_messages(guild_id, time, limit)
-        return [Msg(**msg) for msg in msgs]
+        msgs = await self._fetch_messages(guild_id, time=time, limit=limit)
+        return [Msg.decode(msg) for msg in msgs]
+
+    async def _fetch_messages(self, guild_id: str, /, *, time: int, limit: int) -> List[Dict]:
+        store = self.message_store
+        if store is None:
+            return await self.caller.get_messages(guild_id, time=time, limit=limit)
+        msgs = store.get(guild_id, time, limit)
+        if msgs is not None:
+            return msgs
+        # newer messages only keep arriving as events if the gateway stays up during the request
+        connects = self.connection_stats.connects if self._ready else None
+        msgs = await self.caller.get_messages(guild_id, time=time, limit=limit)
+        live = connects is not None and self._ready and connects == self.connection_stats.connects
+        # a backfill stores a page per request, keep the sqlite writes off the loop
+        await asyncio.get_running_loop().run_in_executor(
+            None, partial(store.add_page, guild_id, msgs, time=time, limit=limit, live=live))
+        return msgs
+
+    def history(self, guild_id: str, /, *, before: int = 0, page_size: int = 50, limit: Optional[int] = None) -> AsyncIterator[Msg]:
+        """
+        Iterate over the messages of a guild from newest to oldest, fetching pages as needed.
+
+        Example:
+            async for msg in client.history(guild_id, page_size=100):
+                ...
+        """
+        return iterators.history(self.caller, guild_id, before=before, page_size=page_size, limit=limit,
+                                 fetch=self._fetch_messages if self.message_store is not None else None)
+
+    def iter_guilds(self) -> AsyncIterator[Guild]:
+        return iterators.guilds(self.caller)
+
+    def iter_dms(self) -> AsyncIterator[Dm]:
+        return iterators.dms(self.caller)
+
+    def iter_members(self, guild_id: Optional[str] = None, /) -> AsyncIterator[User]:
+        """
+        Iterate over the members of a guild, or of every guild if no id is given.
+        """
+        return iterators.members(self.caller, guild_id)
 
     async def get_self(self) -> User:
         user = await self.caller.get_self()
-        return User(**user)
+        return User.decode(user)
 
     async def get_user(self, user_id: str, /) -> User:
-        user = await self.caller.get_user(user_id)
-        return User(**user)
+        if self.state is not None:
+            cached = self.state.users.get(user_id)
+            if cached is not None:
+                return cached
+        user = User.decode(await self.caller.get_user(user_id))
+        if self.state is not None:
+            user = self.state.store_user(user)
+        return user
     
     async def get_user_by_name(self, username: str, /) -> User:
         user = await self.caller.get_user_by_name(username)
-        return User(**user)
+        return User.decode(user)
 
     async def get_bans(self, guild_id: str, /) -> List[User]:
         users = await self.caller.get_bans(guild_id)
-        return [User(**user) for user in users]
+        return [User.decode(user) for user in users]
     
     async def get_admins(self, guild_id: str, /) -> List[User]:
         users = await self.caller.get_admins(guild_id)
-        return [User(**user) for user in users]
+        return [User.decode(user) for user in users]
 
     async def get_members(self, guild_id: str, /) -> List[User]:
-        users = await self.caller.get_members(guild_id)
-        return [User(**user) for user in users]
+        if self.state is not None:
+            cached = self.state.get_members(guild_id)
+            if cached is not None:
+                return cached
+        users = [User.decode(user) for user in await self.caller.get_members(guild_id)]
+        if self.state is not None:
+            self.state.set_members(guild_id, users)
+        return users
+
+    async def get_invites(self, guild_id: str, /) -> List[str]:
+        if self.state is not None:
+            cached = self.state.get_invites(guild_id)
+            if cached is not None:
+                return cached
+        invites = await self.caller.get_invites(guild_id)
+        if self.state is not None:
+            self.state.set_invites(guild_id, invites)
+        return invites
 
     async def send_message(self, guild_id: str, message: str, /) -> None:
         await self.caller.send_message(guild_id, message)
 
+    def queue_message(self, guild_id: str, message: str, /) -> asyncio.Future:
+        """
+        Queue a message without waiting for it to be sent.
+
+        Returns:
+            Future that resolves once the message was delivered
+        """
+        return self.send_queue.put(guild_id, message)
+
     async def start_typing(self, guild_id : str, /) -> None:
         await self.caller.start_typing(guild_id)
 
@@ -142,8 +481,8 @@ class Client(Controller):
     async def leave_guild(self, guild_id: str, /) -> None:
         await self.caller.leave_guild(guild_id)
     
-    async def create_guild(self, name: str, save_chat : bool,/) -> None:
-        await self.caller.create_guild(name, save_chat)
+    async def create_guild(self, name: str, save_chat : bool,/, *, image: Optional[Upload] = None) -> None:
+        await self.caller.create_guild(name, save_chat, image=image)
 
     async def edit_guild(self, guild_id: str, /, *, name: Optional[str] = None, save_chat: Optional[bool]= None, owner_id: Optional[str]= None) -> None:
         await self.caller.edit_guild(guild_id, name=name, save_chat=save_chat, owner_id=owner_id)
@@ -186,6 +525,30 @@ class Client(Controller):
     
     async def kick_user(self, guild_id: str, user_id: str, /) -> None:
         await self.caller.kick_user(guild_id, user_id)
+
+    async def ban_users(self, guild_id: str, user_ids: Iterable[str], /, *, concurrency: int = 10) -> BulkReport:
+        """
+        Ban many users at once, see `bulk.run_bulk`.
+
+        Returns:
+            BulkReport with the outcome for every user id
+        """
+        return await run_bulk(lambda user_id: self.caller.ban_user(guild_id, user_id), user_ids, concurrency=concurrency)
+
+    async def unban_users(self, guild_id: str, user_ids: Iterable[str], /, *, concurrency: int = 10) -> BulkReport:
+        return await run_bulk(lambda user_id: self.caller.unban_user(guild_id, user_id), user_ids, concurrency=concurrency)
+
+    async def kick_users(self, guild_id: str, user_ids: Iterable[str], /, *, concurrency: int = 10) -> BulkReport:
+        return await run_bulk(lambda user_id: self.caller.kick_user(guild_id, user_id), user_ids, concurrency=concurrency)
+
+    async def remove_admins(self, guild_id: str, user_ids: Iterable[str], /, *, concurrency: int = 10) -> BulkReport:
+        return await run_bulk(lambda user_id: self.caller.remove_admin(guild_id, user_id), user_ids, concurrency=concurrency)
+
+    async def delete_msgs(self, guild_id: str, msg_ids: Iterable[str], /, *, concurrency: int = 10) -> BulkReport:
+        return await run_bulk(lambda msg_id: self.caller.delete_msg(guild_id, msg_id), msg_ids, concurrency=concurrency)
+
+    async def delete_invites(self, guild_id: str, invites: Iterable[str], /, *, concurrency: int = 10) -> BulkReport:
+        return await run_bulk(lambda invite: self.caller.delete_invite(guild_id, invite), invites, concurrency=concurrency)
     
     async def edit_self(self, password : str, /, *, new_password : Optional[str] = None,username: Optional[str] = None, email : Optional[str] = None, options : Optional[int] = None) -> None:
         await self.caller.edit_self(password, new_password=new_password, username=username, email=email, options=options)
@@ -221,8 +584,7 @@ if __name__ == "__main__":
                 await self.send_message(data.guild_id, "pong")
             case "pong":
                 guild_data = await self.get_guilds()
-                for guild in guild_data["guilds"]:
-                    await self.send_message(guild.id, "respond")
+                await asyncio.gather(*(self.queue_message(guild.id, "respond") for guild in guild_data["guilds"]))
             case "data":
                 user_data = await self.get_user(data.author.id)
                 await self.send_message(data.guild_id, f"doxxed username:{user_data.name}, id: {user_data.id}, image_id: {user_data.image_id}")
@@ -231,7 +593,7 @@ if __name__ == "__main__":
             case "last_msg":
                 last_msg = await self.get_messages(data.guild_id, 0, 5)
                 for msg in last_msg:
-                    await self.send_message(data.guild_id, f"last msg: {msg.content} by {msg.author.name}")
+                    self.queue_message(data.guild_id, f"last msg: {msg.content} by {msg.author.name}")
             case "start_typing":
                 await self.start_typing(data.guild_id)
             case "join_guild":
@@ -0,0 +1,156 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from log import dispatch_log
+
+BLOCK = "block"
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST)
+
+
+class HandlerStats:
+    __slots__ = ("count", "total", "max", "last")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, duration: float) -> None:
+        self.count += 1
+        self.total += duration
+        self.last = duration
+        if duration > self.max:
+            self.max = duration
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "last": self.last,
+        }
+
+
+class Dispatcher:
+    """
+    Runs event handlers on a fixed pool of workers fed from a bounded queue.
+
+    Events are sharded on a key (the guild id) so every event of one guild is
+    handled by the same worker in the order it was received, while other
+    guilds run in parallel on the other workers.
+
+    Args:
+        workers: number of worker tasks
+        max_queue: max number of events waiting across all workers
+        overflow: what to do when the queue is full, one of
+            "block" (wait, which stalls the websocket reader),
+            "drop_oldest" or "drop_newest"
+    """
+
+    def __init__(self, *, workers: int = 8, max_queue: int = 1000, overflow: str = BLOCK) -> None:
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}")
+        if workers < 1 or max_queue < 1:
+            raise ValueError("workers and max_queue must be at least 1")
+        self.workers = workers
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.dropped = 0
+        self.handler_stats: Dict[str, HandlerStats] = {}
+
+        self._queues: List[Deque[Tuple[Callable, Any, str]]] = [deque() for _ in range(workers)]
+        self._wakeups: List[asyncio.Event] = []
+        self._not_full: Optional[asyncio.Event] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._size = 0
+        self._running = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._size
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._size,
+            "per_worker": [len(queue) for queue in self._queues],
+            "dropped": self.dropped,
+            "handlers": {name: stats.as_dict() for name, stats in self.handler_stats.items()},
+        }
+
+    def start(self, tasks) -> None:
+        self._wakeups = [asyncio.Event() for _ in range(self.workers)]
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        for index in range(self.workers):
+            tasks.create_task(self._worker(index), name=f"dispatch_worker_{index}", background=True)
+
+    async def submit(self, key: Hashable, handler: Callable, data: Any, name: str) -> None:
+        """
+        Queue `handler(data)` behind earlier events with the same key.
+        """
+        while self._size >= self.max_queue:
+            match self.overflow:
+                case "drop_newest":
+                    self.dropped += 1
+                    return
+                case "drop_oldest":
+                    self._drop_oldest(key)
+                case "block":
+                    self._not_full.clear()
+                    await self._not_full.wait()
+        index = hash(key) % self.workers
+        self._queues[index].append((handler, data, name))
+        self._size += 1
+        self._idle.clear()
+        self._wakeups[index].set()
+
+    def _drop_oldest(self, key: Hashable) -> None:
+        # prefer dropping from the shard the new event goes to, otherwise the fullest one
+        queue = self._queues[hash(key) % self.workers]
+        if not queue:
+            queue = max(self._queues, key=len)
+        queue.popleft()
+        self._size -= 1
+        self.dropped += 1
+
+    async def join(self) -> None:
+        """
+        Wait until every queued event was handled.
+        """
+        if self._idle is not None:
+            await self._idle.wait()
+
+    async def _worker(self, index: int) -> None:
+        queue = self._queues[index]
+        wakeup = self._wakeups[index]
+        while True:
+            if not queue:
+                wakeup.clear()
+                await wakeup.wait()
+                continue
+            handler, data, name = queue.popleft()
+            self._size -= 1
+            self._running += 1
+            self._not_full.set()
+            start = time.perf_counter()
+            try:
+                await handler(data)
+            except Exception:
+                dispatch_log.exception("Error in handler %s", name, extra={"event": name, "guild_id": getattr(data, "guild_id", None)})
+            finally:
+                self._running -= 1
+                try:
+                    stats = self.handler_stats[name]
+                except KeyError:
+                    stats = self.handler_stats[name] = HandlerStats()
+                stats.add(time.perf_counter() - start)
+                if self._size == 0 and self._running == 0:
+                    self._idle.set()
@@ -1,4 +1,112 @@
+class ValidationError(ValueError):
+    """
+    Raised when a payload does not match the schema of the model it is decoded into.
+    """
+
+
+class lazy:
+    """
+    Attribute built from the raw payload on first access.
+
+    The raw value lives in the "_<name>_raw" slot and the built one is
+    cached in "_<name>", an unset slot means it has not been built yet.
+    """
+
+    def __init__(self, build):
+        self.build = build
+
+    def __set_name__(self, owner, name):
+        self.raw = f"_{name}_raw"
+        self.value = f"_{name}"
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        try:
+            return getattr(obj, self.value)
+        except AttributeError:
+            value = self.build(getattr(obj, self.raw))
+            setattr(obj, self.value, value)
+            return value
+
+    def __set__(self, obj, value):
+        setattr(obj, self.value, value)
+
+
+def lazy_slots(*names):
+    return tuple(slot for name in names for slot in (f"_{name}_raw", f"_{name}"))
+
+
+def _user(data):
+    return User.decode(data) if data is not None else None
+
+
+def _list(data, name):
+    if type(data) is not list:
+        raise ValidationError(f"{name} must be a list, got {type(data).__name__}")
+    return data
+
+
+def _users(data):
+    return [User.decode(user) for user in _list(data, "mentions")] if data is not None else None
+
+
+def _attachments(data):
+    return [Attachment.decode(attachment) for attachment in _list(data, "attachments")] if data is not None else None
+
+
+def _unread(data):
+    return UnreadMsg.decode(data) if data is not None else None
+
+
+def schema(cls):
+    """
+    Generate `cls.decode(data)` from `cls.__schema__`.
+
+    The schema is a tuple of (payload key, slot, required) entries. The
+    generated decoder fills the slots straight from the payload dict, which
+    skips the keyword argument handling of `cls(**data)`, and raises
+    ValidationError for missing required fields or non object payloads.
+    """
+    required = [(key, slot) for key, slot, is_required in cls.__schema__ if is_required]
+    optional = [(key, slot) for key, slot, is_required in cls.__schema__ if not is_required]
+    lines = [
+        "def decode(data):",
+        "    if type(data) is not dict:",
+        f"        raise ValidationError(f'{cls.__name__} payload must be an object, got {{type(data).__name__}}')",
+        "    obj = new(cls)",
+    ]
+    if required:
+        lines.append("    try:")
+        lines += [f"        obj.{slot} = data[{key!r}]" for key, slot in required]
+        lines += [
+            "    except KeyError as e:",
+            f"        raise ValidationError(f'{cls.__name__} payload is missing required field {{e.args[0]!r}}') from None",
+        ]
+    if optional:
+        lines.append("    get = data.get")
+        lines += [f"    obj.{slot} = get({key!r})" for key, slot in optional]
+    lines.append("    return obj")
+    namespace = {"ValidationError": ValidationError, "new": object.__new__, "cls": cls}
+    exec("\n".join(lines), namespace)
+    cls.decode = staticmethod(namespace["decode"])
+    return cls
+
+
+@schema
 class User:
+    __slots__ = ("id", "name", "image_id", "email", "flags", "options", "permissions")
+
+    __schema__ = (
+        ("id", "id", True),
+        ("name", "name", False),
+        ("imageId", "image_id", False),
+        ("email", "email", False),
+        ("flags", "flags", False),
+        ("options", "options", False),
+        ("permissions", "permissions", False),
+    )
+
     def __init__(self, id, name=None, imageId=None, email=None, flags=None, options=None, permissions=None):
         self.id = id
         self.name = name
@@ -9,15 +117,37 @@ class User:
         self.permissions = permissions
 
 
+@schema
 class Member:
+    __slots__ = ("guild_id", "admin", "owner") + lazy_slots("user_info")
+
+    __schema__ = (
+        ("admin", "admin", True),
+        ("owner", "owner", True),
+        ("userInfo", "_user_info_raw", True),
+        ("guildId", "guild_id", False),
+    )
+
+    user_info = lazy(_user)
+
     def __init__(self, admin, owner, userInfo, guildId=None):
         self.guild_id = guildId
         self.admin = admin
         self.owner = owner
-        self.user_info = User(**userInfo)
+        self._user_info_raw = userInfo
 
 
+@schema
 class UnreadMsg:
+    __slots__ = ("msg_id", "count", "time", "mentions")
+
+    __schema__ = (
+        ("msgId", "msg_id", True),
+        ("count", "count", True),
+        ("time", "time", True),
+        ("mentions", "mentions", True),
+    )
+
     def __init__(self, msgId, count, time, mentions):
         self.msg_id = msgId
         self.count = count
@@ -25,17 +155,48 @@ class UnreadMsg:
         self.mentions = mentions
 
 
+@schema
 class Attachment:
+    __slots__ = ("id", "filename", "type")
+
+    __schema__ = (
+        ("id", "id", True),
+        ("filename", "filename", True),
+        ("type", "type", True),
+    )
+
     def __init__(self, id, filename, type):
         self.id = id
         self.filename = filename
         self.type = type
 
 
+@schema
 class Msg:
+    __slots__ = ("id", "content", "guild_id", "created", "modified", "msg_saved", "request_id",
+                 "mentions_everyone") + lazy_slots("author", "mentions", "attachments")
+
+    __schema__ = (
+        ("id", "id", True),
+        ("guildId", "guild_id", True),
+        ("content", "content", True),
+        ("author", "_author_raw", False),
+        ("created", "created", False),
+        ("modified", "modified", False),
+        ("msgSaved", "msg_saved", False),
+        ("requestId", "request_id", False),
+        ("mentionsEveryone", "mentions_everyone", False),
+        ("mentions", "_mentions_raw", False),
+        ("attachments", "_attachments_raw", False),
+    )
+
+    author = lazy(_user)
+    mentions = lazy(_users)
+    attachments = lazy(_attachments)
+
     def __init__(self, id, guildId, content,author=None,  created=None, modified=None, msgSaved=None, requestId=None, mentionsEveryone=None, mentions=None, attachments=None):
         self.id = id
-        self.author = User(**author) if author is not None else None
+        self._author_raw = author
         self.content = content
         self.guild_id = guildId
         self.created = created
@@ -43,19 +204,45 @@ class Msg:
         self.msg_saved = msgSaved
         self.request_id = requestId
         self.mentions_everyone = mentionsEveryone
-        self.mentions = [User(**mention) for mention in mentions] if mentions is not None else None
-        self.attachments = [Attachment(**attachment)
-                            for attachment in attachments] if attachments is not None else None
+        self._mentions_raw = mentions
+        self._attachments_raw = attachments
 
 
+@schema
 class Dm:
+    __slots__ = ("id",) + lazy_slots("user_info", "unread")
+
+    __schema__ = (
+        ("id", "id", True),
+        ("userInfo", "_user_info_raw", True),
+        ("unread", "_unread_raw", True),
+    )
+
+    user_info = lazy(_user)
+    unread = lazy(_unread)
+
     def __init__(self, id, userInfo, unread):
         self.id = id
-        self.user_info = User(**userInfo)
-        self.unread = UnreadMsg(**unread)
+        self._user_info_raw = userInfo
+        self._unread_raw = unread
 
 
+@schema
 class Guild:
+    __slots__ = ("id", "dm", "name", "image_id", "owner_id", "save_chat") + lazy_slots("unread")
+
+    __schema__ = (
+        ("id", "id", True),
+        ("name", "name", False),
+        ("imageId", "image_id", False),
+        ("ownerId", "owner_id", False),
+        ("dm", "dm", False),
+        ("saveChat", "save_chat", False),
+        ("unread", "_unread_raw", False),
+    )
+
+    unread = lazy(_unread)
+
     def __init__(self, id, name=None, imageId=None, ownerId=None, dm=None, saveChat=None, unread=None):
         self.id = id
         self.dm = dm
@@ -63,15 +250,46 @@ class Guild:
         self.image_id = imageId
         self.owner_id = ownerId
         self.save_chat = saveChat
-        self.unread = UnreadMsg(**unread) if unread is not None else None
+        self._unread_raw = unread
 
+@schema
 class Typing:
+    __slots__ = ("guild_id", "time") + lazy_slots("user_info")
+
+    __schema__ = (
+        ("guildId", "guild_id", True),
+        ("userInfo", "_user_info_raw", True),
+        ("time", "time", True),
+    )
+
+    user_info = lazy(_user)
+
     def __init__(self, guildId, userInfo, time):
         self.guild_id = guildId
-        self.user_info = User(**userInfo)
+        self._user_info_raw = userInfo
         self.time = time
 
+@schema
 class Invite:
+    __slots__ = ("guild_id", "invite")
+
+    __schema__ = (
+        ("guildId", "guild_id", True),
+        ("invite", "invite", True),
+    )
+
     def __init__(self, guildId, invite):
         self.guild_id = guildId
         self.invite = invite
+
+
+# first word of the event name -> decoder for its payload
+DECODERS = {
+    "guild": Guild.decode,
+    "invite": Invite.decode,
+    "dm": Dm.decode,
+    "message": Msg.decode,
+    "member": Member.decode,
+    "user": User.decode,
+    "typing": Typing.decode,
+}
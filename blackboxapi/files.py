@@ -0,0 +1,212 @@
+import asyncio
+import mimetypes
+import os
+from typing import IO, Any, AsyncIterable, AsyncIterator, Callable, List, Optional, Sequence, Union
+
+from events import Attachment
+
+CHUNK_SIZE = 64 * 1024
+
+# progress(bytes done, total bytes or None when unknown)
+Progress = Callable[[int, Optional[int]], Any]
+
+Source = Union[str, os.PathLike, bytes, IO[bytes], AsyncIterable[bytes]]
+
+
+class Upload:
+    """
+    A file to send, read in `chunk_size` pieces while the request is written.
+
+    The source can be a path, bytes, a binary file object or an async
+    iterable of bytes. Paths are opened for every attempt so a request
+    retried after a 429 sends the file again, file objects are rewound when
+    they can seek, async iterables can only be sent once.
+    """
+
+    def __init__(self, source: Source, /, *, filename: Optional[str] = None, content_type: Optional[str] = None,
+                 progress: Optional[Progress] = None) -> None:
+        self.source = source
+        if filename is None:
+            if isinstance(source, (str, os.PathLike)):
+                filename = os.path.basename(source)
+            else:
+                filename = os.path.basename(getattr(source, "name", "")) or "file"
+        self.filename = filename
+        self.content_type = content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        self.progress = progress
+        self._used = False
+
+    @property
+    def size(self) -> Optional[int]:
+        if isinstance(self.source, (str, os.PathLike)):
+            return os.path.getsize(self.source)
+        if isinstance(self.source, bytes):
+            return len(self.source)
+        return None
+
+    async def chunks(self, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        source = self.source
+        total = self.size
+        sent = 0
+        if isinstance(source, bytes):
+            chunks = _byte_chunks(source, chunk_size)
+        elif isinstance(source, (str, os.PathLike)):
+            chunks = _file_chunks(None, source, chunk_size)
+        elif hasattr(source, "read"):
+            if self._used:
+                if not source.seekable():
+                    raise RuntimeError(f"{self.filename} cannot be sent again, its file cannot seek")
+                source.seek(0)
+            chunks = _file_chunks(source, None, chunk_size)
+        else:
+            if self._used:
+                raise RuntimeError(f"{self.filename} cannot be sent again, its iterator was consumed")
+            chunks = source
+        self._used = True
+        async for chunk in chunks:
+            sent += len(chunk)
+            yield chunk
+            if self.progress is not None:
+                self.progress(sent, total)
+
+
+async def _byte_chunks(data: bytes, chunk_size: int) -> AsyncIterator[bytes]:
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
+
+
+async def _file_chunks(f: Optional[IO[bytes]], path: Optional[Union[str, os.PathLike]], chunk_size: int) -> AsyncIterator[bytes]:
+    # reads go to a thread so a slow disk does not block the loop
+    loop = asyncio.get_running_loop()
+    opened = f is None
+    if opened:
+        f = await loop.run_in_executor(None, open, path, "rb")
+    try:
+        while True:
+            chunk = await loop.run_in_executor(None, f.read, chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        if opened:
+            f.close()
+
+
+def _as_upload(file: Union[Upload, Source]) -> Upload:
+    return file if isinstance(file, Upload) else Upload(file)
+
+
+class Transfers:
+    """
+    Attachment and image uploads and downloads, streamed in `chunk_size` pieces.
+
+    At most `concurrency` transfers run at once, so memory use stays around
+    concurrency * chunk_size however large the files are.
+
+    Args:
+        concurrency: transfers running at once, the rest wait
+        chunk_size: bytes read from disk or the network at a time
+    """
+
+    def __init__(self, caller, *, concurrency: int = 4, chunk_size: int = CHUNK_SIZE) -> None:
+        self.caller = caller
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.uploaded = 0  # bytes
+        self.downloaded = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def _upload(self, request_type: str, route: str, fields: dict, files: List[tuple], **path: str) -> None:
+        counted = [(name, _Counted(self, upload)) for name, upload in files]
+        async with self.semaphore:
+            await self.caller._request(request_type, route, data=fields, files=counted, chunk_size=self.chunk_size, **path)
+
+    async def send_files(self, guild_id: str, files: Sequence[Union[Upload, Source]], /, message: str = "") -> None:
+        """
+        Send a message with attachments, files can be Upload objects or anything Upload accepts.
+        """
+        await self._upload("POST", "/guilds/{guild_id}/msgs", {"content": message},
+                           [("file", _as_upload(file)) for file in files], guild_id=guild_id)
+
+    async def set_guild_image(self, guild_id: str, image: Union[Upload, Source], /) -> None:
+        await self._upload("PATCH", "/guilds/{guild_id}", {}, [("image", _as_upload(image))], guild_id=guild_id)
+
+    async def set_user_image(self, image: Union[Upload, Source], /) -> None:
+        await self._upload("PATCH", "/users/@me", {}, [("image", _as_upload(image))])
+
+    async def _iter(self, route: str, progress: Optional[Progress], **path: str) -> AsyncIterator[bytes]:
+        async with self.semaphore:
+            async for chunk in self.caller._stream(route, chunk_size=self.chunk_size, progress=progress, **path):
+                self.downloaded += len(chunk)
+                yield chunk
+
+    def iter_attachment(self, attachment: Union[Attachment, str], /, *, progress: Optional[Progress] = None) -> AsyncIterator[bytes]:
+        """
+        The bytes of an attachment as they arrive.
+
+        Example:
+            async for chunk in client.files.iter_attachment(msg.attachments[0]):
+                ...
+        """
+        attachment_id = attachment.id if isinstance(attachment, Attachment) else attachment
+        return self._iter("/files/attachment/{attachment_id}", progress, attachment_id=attachment_id)
+
+    def iter_image(self, image_id: str, /, *, progress: Optional[Progress] = None) -> AsyncIterator[bytes]:
+        """
+        The bytes of a user or guild image (User.image_id, Guild.image_id).
+        """
+        return self._iter("/files/image/{image_id}", progress, image_id=image_id)
+
+    async def download_attachment(self, attachment: Union[Attachment, str], path: Union[str, os.PathLike], /, *,
+                                  progress: Optional[Progress] = None) -> int:
+        """
+        Write an attachment to `path`, returns the number of bytes written.
+        """
+        return await _write(self.iter_attachment(attachment, progress=progress), path)
+
+    async def download_image(self, image_id: str, path: Union[str, os.PathLike], /, *,
+                             progress: Optional[Progress] = None) -> int:
+        return await _write(self.iter_image(image_id, progress=progress), path)
+
+
+class _Counted:
+    # adds the bytes an upload sends to the Transfers count
+    def __init__(self, transfers: Transfers, upload: Upload) -> None:
+        self.transfers = transfers
+        self.upload = upload
+        self.filename = upload.filename
+        self.content_type = upload.content_type
+
+    async def chunks(self, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        async for chunk in self.upload.chunks(chunk_size):
+            self.transfers.uploaded += len(chunk)
+            yield chunk
+
+
+async def _write(chunks: AsyncIterator[bytes], path: Union[str, os.PathLike]) -> int:
+    # written next to the target and renamed at the end, a failed download leaves no partial file
+    loop = asyncio.get_running_loop()
+    partial = f"{os.fspath(path)}.part"
+    f = await loop.run_in_executor(None, open, partial, "wb")
+    written = 0
+    try:
+        async for chunk in chunks:
+            await loop.run_in_executor(None, f.write, chunk)
+            written += len(chunk)
+    except BaseException:
+        f.close()
+        os.remove(partial)
+        raise
+    finally:
+        # releases the transfer slot right away instead of when the generator is collected
+        await chunks.aclose()
+    f.close()
+    os.replace(partial, path)
+    return written
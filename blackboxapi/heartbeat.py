@@ -0,0 +1,73 @@
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class Heartbeat:
+    """
+    Matches heartbeats against their ACKs to measure gateway latency.
+
+    The server acknowledges heartbeats in order, so every ACK is paired with
+    the oldest heartbeat still waiting for one. A connection with more than
+    `max_missed` heartbeats unacknowledged is treated as dead.
+
+    Args:
+        max_missed: unacknowledged heartbeats allowed before the connection is dead
+        samples: number of latency samples kept for the percentiles
+    """
+
+    def __init__(self, *, max_missed: int = 2, samples: int = 100) -> None:
+        self.max_missed = max_missed
+        self.latencies: Deque[float] = deque(maxlen=samples)
+        self.last: Optional[float] = None
+        self.sent_count = 0
+        self.ack_count = 0
+        self._pending: Deque[float] = deque()
+
+    @property
+    def missed(self) -> int:
+        return len(self._pending)
+
+    @property
+    def dead(self) -> bool:
+        return len(self._pending) > self.max_missed
+
+    def reset(self) -> None:
+        # new connection, acks for the old one will never arrive
+        self._pending.clear()
+
+    def sent(self) -> None:
+        self.sent_count += 1
+        self._pending.append(time.perf_counter())
+
+    def ack(self) -> None:
+        if not self._pending:
+            return  # ack we never asked for
+        self.ack_count += 1
+        self.last = time.perf_counter() - self._pending.popleft()
+        self.latencies.append(self.last)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+        return ordered[index]
+
+    @property
+    def p50(self) -> Optional[float]:
+        return self.percentile(50)
+
+    @property
+    def p99(self) -> Optional[float]:
+        return self.percentile(99)
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        return {
+            "last": self.last,
+            "p50": self.p50,
+            "p99": self.p99,
+            "missed": self.missed,
+            "sent": self.sent_count,
+            "acked": self.ack_count,
+        }
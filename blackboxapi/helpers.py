@@ -1,36 +1,107 @@
-import aiohttp
 import asyncio
-import json
-from typing import List, Dict, Union, Optional, Any
-from events import Guild, Msg, User, Dm, Typing, Invite, Member
+import logging
+import time
+from functools import partial
+from typing import TYPE_CHECKING, AsyncIterator, Callable, FrozenSet, List, Dict, Tuple, Union, Optional, Any
+from events import DECODERS, Guild, Msg, User, Dm, Typing, Invite, Member
+from ratelimit import RateLimiter
+from codec import Codec, default_codec
+from transport import Transport
+from log import ROOT, dispatch_log, http_log
+from metrics import Metrics, NULL_METRICS, current_span
+from retry import CLOSED, CircuitOpenError, RetryPolicy
+
+if TYPE_CHECKING:
+    import aiohttp
 
 ENDPOINT_URL = "localhost:8080/api"
 
 JSON_CONTENT = "application/json"
 FORM_CONTENT = "application/x-www-form-urlencoded"
+MULTIPART_CONTENT = "multipart/form-data"
 
 
 class Tasks:
-    def __init__(self):
+    def __init__(self, metrics: Metrics = NULL_METRICS):
+        self.metrics = metrics
         self._tasks: List[asyncio.Task] = set()
+        # long running tasks (workers, timers) that are never waited on when draining
+        self._background: List[asyncio.Task] = set()
+        # coroutine functions awaited by stop_tasks before anything is cancelled
+        self._shutdown_hooks: List[Callable[[], Any]] = []
 
-    def create_task(self, coro, *, name):
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def create_task(self, coro, *, name, background=False):
         task = asyncio.create_task(coro, name=name)
         # i honestly cannot believe that exceptions are not raised in async tasks
         # wtf
 
         def task_finish(task):
             self._tasks.remove(task)
-            if task.exception() is not None:
-                raise task.exception()
+            self._background.discard(task)
+            if self.metrics.enabled:
+                self.metrics.gauge("tasks_pending", len(self._tasks))
+            if not task.cancelled() and task.exception() is not None:
+                error = task.exception()
+                dispatch_log.error("Error in task %s", task.get_name(), exc_info=(type(error), error, error.__traceback__),
+                                   extra={"event": task.get_name()})
         task.add_done_callback(task_finish)
         self._tasks.add(task)
-    async def stop_tasks(self):
+        if background:
+            self._background.add(task)
+        if self.metrics.enabled:
+            self.metrics.gauge("tasks_pending", len(self._tasks))
+        return task
+
+    def add_shutdown_hook(self, hook: Callable[[], Any]) -> None:
+        self._shutdown_hooks.append(hook)
+
+    async def stop_tasks(self, timeout: Optional[float] = None):
+        """
+        Cancel every task, after giving handlers up to `timeout` seconds to finish.
+
+        Shutdown hooks (such as flushing the send queue) run after the
+        handlers, so whatever they queued while finishing is still sent.
+        """
+        if timeout:
+            pending = self._tasks - self._background
+            if pending:
+                await asyncio.wait(pending, timeout=timeout)
+        for hook in self._shutdown_hooks:
+            try:
+                await asyncio.wait_for(hook(), timeout)
+            except Exception:
+                logging.getLogger(ROOT).exception("Shutdown hook %r failed", hook)
         for task in self._tasks:
             task.cancel()
         await asyncio.gather(*self._tasks, return_exceptions=True)
 
 
+# event name -> (lowercase name, handler name, payload decoder, field holding the guild id)
+EVENT_TABLE: Dict[str, Tuple[str, str, Optional[Callable[[Any], Any]], str]] = {}
+
+
+def _event_entry(event: str) -> Tuple[str, str, Optional[Callable[[Any], Any]], str]:
+    lower = event.lower()
+    data_type = lower.split("_")[0]
+    # guild events carry their id as "id", everything else as "guildId"
+    key_field = "id" if data_type == "guild" else "guildId"
+    return lower, "on_"+lower, DECODERS.get(data_type), key_field
+
+
+class Decoded:
+    """
+    Event payload that was already decoded off the loop, with its shard key.
+    """
+    __slots__ = ("value", "key")
+
+    def __init__(self, value: Any, key: Optional[str]) -> None:
+        self.value = value
+        self.key = key
+
+
 class Controller:
     def event(self, coro):
         name = "on_"+coro.__name__
@@ -41,36 +112,106 @@ class Controller:
         # coro.__get__ required for calling it as a method
         # otherwise it calls a regular function
         setattr(self, name, coro.__get__(self))
+        # which events get skipped depends on the handlers
+        self._wanted.clear()
+        self._wanted_names = None
         return coro
 
+    def _wants(self, lower: str, name: str) -> bool:
+        # decoded when the cache or the store need it even without a handler
+        if self.state is not None and lower in self.state.EVENTS:
+            return True
+        if self.message_store is not None and lower in self.message_store.EVENTS:
+            return True
+        return self._handles(name)
+
+    def _handles(self, name: str) -> bool:
+        default = getattr(Controller, name, None)
+        if default is None:
+            # not an event the library knows, let _process_event report it
+            return True
+        # registered with event() or overridden in a subclass
+        return name in self.__dict__ or getattr(type(self), name) is not default
+
+    def wanted_events(self) -> FrozenSet[str]:
+        """
+        Lowercase names of the events that get decoded, sent along with every frame given to a FrameDecoder.
+        """
+        if self._wanted_names is None:
+            self._wanted_names = frozenset(name[3:] for name in dir(Controller)
+                                           if name.startswith("on_") and self._wants(name[3:], name))
+        return self._wanted_names
+
+    def subscriptions(self) -> List[str]:
+        """
+        Events that have a handler or are needed by the cache, everything else is skipped undecoded.
+        """
+        return [
+            name[3:].upper() for name in dir(Controller)
+            if name.startswith("on_") and name != "on_ready" and self._wants(name[3:], name)
+        ]
+
     async def _process_event(self, data, event):
-        name = "on_"+event.lower()
-        data_type = event.lower().split("_")[0]
-        print(data)
-        match data_type:
-            case "guild":
-                data = Guild(**data)
-            case "invite":
-                data = Invite(**data)
-            case "dm":
-                data = Dm(**data)
-            case "message":
-                data = Msg(**data)
-            case "member":
-                data = Member(**data)
-            case "user":
-                data = User(**data)
-            case "typing":
-                data = Typing(**data)
-            case _:
-                print(f"Unknown event type {data_type}")
+        try:
+            lower, name, decode, key_field = EVENT_TABLE[event]
+        except KeyError:
+            lower, name, decode, key_field = EVENT_TABLE[event] = _event_entry(event)
+        try:
+            wanted, handled = self._wanted[event]
+        except KeyError:
+            wanted, handled = self._wanted[event] = (self._wants(lower, name), self._handles(name))
+        if not wanted:
+            self.events_skipped += 1
+            if self.metrics.enabled:
+                self.metrics.inc("events_skipped_total", event=lower)
+            return
+        if type(data) is Decoded:
+            data, key = data.value, data.key
+            if dispatch_log.isEnabledFor(logging.DEBUG):
+                dispatch_log.debug("Dispatch %s %r", lower, data, extra={"event": lower, "guild_id": key})
+        else:
+            key = data.get(key_field) if isinstance(data, dict) else None
+            if dispatch_log.isEnabledFor(logging.DEBUG):
+                dispatch_log.debug("Dispatch %s %s", lower, data, extra={"event": lower, "guild_id": key})
+            if decode is not None:
+                data = decode(data)
+            else:
+                dispatch_log.warning("Unknown event type %s", lower.split("_")[0], extra={"event": lower})
                 data = None
+        if self.state is not None and data is not None:
+            self.state.update(lower, data)
+        if self.message_store is not None and data is not None and lower in self.message_store.EVENTS:
+            self.message_store.update(lower, data)
+        if not handled:
+            # only decoded for the cache or the store, no task for the no-op default
+            self.events_skipped += 1
+            if self.metrics.enabled:
+                self.metrics.inc("events_skipped_total", event=lower)
+            return
         try:
             coro = getattr(self, name)
         except AttributeError:
-            print(f"Unidentified event: {event}")
+            dispatch_log.warning("Unidentified event: %s", event, extra={"event": lower})
         else:
-            self.tasks.create_task(coro(data), name=name)
+            if self.metrics.enabled:
+                self.metrics.inc("events_total", event=lower)
+                span = self.metrics.start_span("event", event=lower, guild_id=key)
+                coro = partial(self._run_instrumented, coro, event=lower, span=span)
+            if self.dispatcher is not None:
+                await self.dispatcher.submit(key, coro, data, name)
+            else:
+                self.tasks.create_task(coro(data), name=name)
+
+    async def _run_instrumented(self, coro, data, *, event, span):
+        # REST calls made by the handler pick the span up as their parent
+        token = current_span.set(span)
+        start = time.perf_counter()
+        try:
+            await coro(data)
+        finally:
+            self.metrics.observe("handler_duration_seconds", time.perf_counter() - start, event=event)
+            self.metrics.end_span(span)
+            current_span.reset(token)
 
     async def on_ready(self) -> None:
         """
@@ -192,55 +333,260 @@ class Controller:
         pass
 
 class Caller:
-    def __init__(self, token: str) -> None:
+    def __init__(self, token: str, *, rate_limiter: Optional[RateLimiter] = None, codec: Optional[Codec] = None, session: Optional["aiohttp.ClientSession"] = None, transport: Optional[Transport] = None, coalesce: bool = True, metrics: Metrics = NULL_METRICS, retry: Optional[RetryPolicy] = None) -> None:
         self.token = token
-        self.session = None
+        self.metrics = metrics
+        # retries and circuit breakers for transient failures, RetryPolicy(retries=0, breaker_threshold=None) turns them off
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.coalesce = coalesce
+        self.coalesced = 0  # GETs that were served by a request already in flight
+        self._inflight: Dict[Tuple[str, Optional[Tuple]], asyncio.Future] = {}
+        self.transport = transport if transport is not None else Transport()
+        endpoint = self.transport.endpoint or ENDPOINT_URL
+        self.base_url = f"{'https' if self.transport.secure else 'http'}://{endpoint}"
+        self.gateway_url = f"{'wss' if self.transport.secure else 'ws'}://{endpoint}/ws/"
+        # built once, _request picks one by content type
+        self._headers = {
+            content_type: {"authorization": token, "content-type": content_type}
+            for content_type in (JSON_CONTENT, FORM_CONTENT)
+        }
+        # aiohttp sets the multipart content type itself, it carries the boundary
+        self._headers[MULTIPART_CONTENT] = {"authorization": token}
+        # a session passed in is shared with other callers and left open on stop
+        self.session = session
+        self._owns_session = session is None
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self.codec = codec if codec is not None else default_codec
     
     def _start_session(self):
-        self.session = aiohttp.ClientSession()
+        if self.session is None:
+            self.session = self.transport.create_session()
+            self._owns_session = True
     
+    def use_session(self, session: "aiohttp.ClientSession") -> None:
+        """
+        Send requests through a session shared with other callers, it is not closed on stop.
+        """
+        self.session = session
+        self._owns_session = False
+
     async def _stop_session(self):
-        await self.session.close()
+        if self._owns_session and self.session is not None:
+            await self.session.close()
+            self.session = None
 
-    async def _request(self, request_type: str, route: str, /, *, data: Optional[Dict] = None, content_type: str = JSON_CONTENT) -> Any:
-        url = f"http://{ENDPOINT_URL}{route}"
-        headers = {
-            "authorization": self.token,
-            "content-type": content_type
-        }
+    async def _request(self, request_type: str, route: str, /, *, data: Optional[Dict] = None, content_type: str = JSON_CONTENT,
+                       files: Optional[List[Tuple[str, Any]]] = None, chunk_size: int = 64 * 1024,
+                       idempotent: Optional[bool] = None, **path: str) -> Any:
+        """
+        Send a request to the api.
+
+        `route` is a template such as "/guilds/{guild_id}/msgs" filled in from
+        `path`, the template is what rate limit buckets are keyed on.
+        Requests that hit a 429 wait for the bucket to reset and are retried.
+        Concurrent GETs for the same url and params are sent once.
+
+        With `files`, a list of (field name, Upload), the request is sent as
+        multipart with `data` in a json "body" field and every file streamed
+        in `chunk_size` pieces.
+
+        Transient failures are retried by the retry policy when the method is
+        in its retried methods, `idempotent` overrides that for one call.
+        """
+        url = self.base_url + (route.format(**path) if path else route)
+        if files is not None:
+            return await self._send_retrying(request_type, route, url, data, MULTIPART_CONTENT, idempotent,
+                                             files=files, chunk_size=chunk_size)
+        if request_type != "GET" or not self.coalesce:
+            return await self._send_retrying(request_type, route, url, data, content_type, idempotent)
+        # identical GETs in flight share one request, the result is shared so do not mutate it
+        key = (url, tuple(sorted(data.items())) if data else None)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._send_retrying(request_type, route, url, data, content_type, idempotent))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield so one caller being cancelled does not cancel the request for the others
+        return await asyncio.shield(task)
+
+    async def _send_retrying(self, request_type: str, route: str, url: str, data: Optional[Dict], content_type: str,
+                             idempotent: Optional[bool], **kwargs) -> Any:
+        policy = self.retry
+        breaker = policy.breaker(route)
+        retries = policy.retries if (idempotent if idempotent is not None else request_type in policy.methods) else 0
+        attempt = 0
+        while True:
+            if breaker is not None:
+                try:
+                    breaker.before()
+                except CircuitOpenError:
+                    policy.short_circuited += 1
+                    if self.metrics.enabled:
+                        self.metrics.inc("rest_short_circuited_total", route=route)
+                    raise
+            try:
+                result = await self._send(request_type, route, url, data, content_type, **kwargs)
+            except Exception as e:
+                transient = policy.retry_on(e)
+                if breaker is not None:
+                    # a 4xx means the server is answering, only transient errors count against the route
+                    if transient:
+                        breaker.failure()
+                    else:
+                        breaker.success()
+                if not transient:
+                    raise
+                if attempt >= retries or (breaker is not None and breaker.state != CLOSED):
+                    policy.gave_up += 1
+                    if retries:
+                        http_log.warning("%s %s failed after %d attempts (%s), giving up", request_type, route,
+                                         attempt + 1, e, extra={"route": route})
+                    raise
+                delay = policy.backoff.delay(attempt)
+                attempt += 1
+                policy.retried += 1
+                if self.metrics.enabled:
+                    self.metrics.inc("rest_retries_total", method=request_type, route=route)
+                # retries are routine, only giving up is worth a warning
+                http_log.debug("%s %s failed (%s), retry %d in %.2fs", request_type, route, e, attempt, delay,
+                               extra={"route": route})
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # cancelled, the request may never have reached the server
+                if breaker is not None:
+                    breaker.abandoned()
+                raise
+            if breaker is not None:
+                breaker.success()
+            return result
+
+    async def _send(self, request_type: str, route: str, url: str, data: Optional[Dict], content_type: str,
+                    files: Optional[List[Tuple[str, Any]]] = None, chunk_size: int = 64 * 1024) -> Any:
+        try:
+            headers = self._headers[content_type]
+        except KeyError:
+            headers = self._headers[content_type] = {"authorization": self.token, "content-type": content_type}
         json_data = None
-        if data is not None:
-            json_data = json.dumps(data)
-        async with self.session.request(request_type, url, headers=headers,
-                                        data=json_data if request_type != "GET" else None,
-                                        params=data if request_type == "GET" else None
-                                        ) as response:
-            response.raise_for_status()
-            print(response.url)
-            if request_type == "GET":
-                return await response.json()
+        if data is not None and request_type != "GET":
+            json_data = self.codec.dumps(data)
+        bucket = self.rate_limiter.get_bucket(request_type, route)
+        attempt = 0
+        debug = http_log.isEnabledFor(logging.DEBUG)
+        metrics = self.metrics if self.metrics.enabled else None
+        span = metrics.start_span("rest", method=request_type, route=route) if metrics else None
+        try:
+            while True:
+                await self.rate_limiter.acquire(bucket)
+                body = json_data
+                if files is not None:
+                    # built for every attempt, the file streams cannot be replayed
+                    body = self._form(json_data, files, chunk_size)
+                if debug or metrics:
+                    start = time.perf_counter()
+                async with self.session.request(request_type, url, headers=headers,
+                                                data=body if request_type != "GET" else None,
+                                                params=data if request_type == "GET" else None
+                                                ) as response:
+                    self.rate_limiter.update(bucket, response.headers)
+                    if debug or metrics:
+                        latency = time.perf_counter() - start
+                        if metrics:
+                            metrics.observe("rest_request_duration_seconds", latency, method=request_type, route=route)
+                            metrics.inc("rest_responses_total", method=request_type, route=route, status=str(response.status))
+                        if debug:
+                            http_log.debug("%s %s -> %d", request_type, response.url, response.status,
+                                           extra={"route": route, "status": response.status, "latency": latency})
+                    if response.status == 429 and attempt < self.rate_limiter.max_retries:
+                        self.rate_limiter.on_429(bucket, response.headers)
+                        http_log.debug("Rate limited on %s %s, retrying", request_type, route,
+                                       extra={"route": route, "status": 429})
+                        attempt += 1
+                        continue
+                    if response.status == 429:
+                        http_log.warning("Still rate limited on %s %s after %d retries, giving up", request_type, route,
+                                         attempt, extra={"route": route, "status": 429})
+                    response.raise_for_status()
+                    if request_type == "GET":
+                        # decode straight from the body bytes, no intermediate str
+                        body = await response.read()
+                        if not body.strip():
+                            # like response.json(), an empty body (204 or empty 200) is None
+                            return None
+                        return self.codec.loads(body)
+                    return
+        finally:
+            if span is not None:
+                metrics.end_span(span)
+
+    @staticmethod
+    def _form(body: Optional[bytes], files: List[Tuple[str, Any]], chunk_size: int) -> "aiohttp.FormData":
+        import aiohttp
+        form = aiohttp.FormData()
+        if body is not None:
+            form.add_field("body", body.decode(), content_type=JSON_CONTENT)
+        for name, upload in files:
+            form.add_field(name, upload.chunks(chunk_size), filename=upload.filename, content_type=upload.content_type)
+        return form
+
+    async def _stream(self, route: str, /, *, chunk_size: int = 64 * 1024, progress=None, **path: str) -> AsyncIterator[bytes]:
+        """
+        GET a route and yield the body in chunks of at most `chunk_size` bytes instead of reading it whole.
+
+        Rate limits are handled like _send, a 429 is retried before anything is yielded.
+        """
+        url = self.base_url + (route.format(**path) if path else route)
+        headers = self._headers[JSON_CONTENT]
+        bucket = self.rate_limiter.get_bucket("GET", route)
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire(bucket)
+            async with self.session.get(url, headers=headers) as response:
+                self.rate_limiter.update(bucket, response.headers)
+                if http_log.isEnabledFor(logging.DEBUG):
+                    http_log.debug("GET %s -> %d (streamed)", response.url, response.status,
+                                   extra={"route": route, "status": response.status})
+                if response.status == 429 and attempt < self.rate_limiter.max_retries:
+                    self.rate_limiter.on_429(bucket, response.headers)
+                    http_log.debug("Rate limited on GET %s, retrying", route, extra={"route": route, "status": 429})
+                    attempt += 1
+                    continue
+                if response.status == 429:
+                    http_log.warning("Still rate limited on GET %s after %d retries, giving up", route, attempt,
+                                     extra={"route": route, "status": 429})
+                response.raise_for_status()
+                total = response.content_length
+                received = 0
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    received += len(chunk)
+                    yield chunk
+                    if progress is not None:
+                        progress(received, total)
+                return
 
     async def get_guilds(self) -> List[Dict[str, Union[str, Dict]]]:
         return await self._request("GET", "/users/@me/guilds")
     
     async def get_bans(self, guild_id : str, /) -> List[Dict[str, str]]:
-        return await self._request("GET", f"/guilds/{guild_id}/bans")
+        return await self._request("GET", "/guilds/{guild_id}/bans", guild_id=guild_id)
 
     async def get_admins(self, guild_id : str, /) -> List[Dict[str, str]]:
-        return await self._request("GET", f"/guilds/{guild_id}/admins")
+        return await self._request("GET", "/guilds/{guild_id}/admins", guild_id=guild_id)
 
     async def get_members(self, guild_id : str, /) -> List[Dict[str, str]]:
-        return await self._request("GET", f"/guilds/{guild_id}/members")
+        return await self._request("GET", "/guilds/{guild_id}/members", guild_id=guild_id)
 
     async def get_messages(self, guild_id: str, /, *, time: int, limit: int) -> List[Dict[str, Union[str, Dict]]]:
         send_data = {
             "time": str(time) if time > 0 else "",
             "limit": str(limit)
         }
-        return await self._request("GET", f"/guilds/{guild_id}/msgs", data=send_data)
+        return await self._request("GET", "/guilds/{guild_id}/msgs", data=send_data, guild_id=guild_id)
 
     async def get_invites(self, guild_id : str, /) -> List[Dict[str, str]]:
-        return await self._request("GET", f"/guilds/{guild_id}/invites")
+        return await self._request("GET", "/guilds/{guild_id}/invites", guild_id=guild_id)
 
     async def get_friend_requests(self) -> Dict[str,List[Dict[str, str]]]:
         return await self._request("GET", "/users/@me/requests")
@@ -255,23 +601,24 @@ class Caller:
         return await self._request("GET", "/users/@me")
 
     async def get_user(self, user_id: str, /) -> Dict[str, str]:
-        return await self._request("GET", f"/users/{user_id}")
+        return await self._request("GET", "/users/{user_id}", user_id=user_id)
 
     async def get_user_by_name(self, username: str, /) -> Dict[str, str]:
-        return await self._request("GET", f"/users/username/{username}")
+        return await self._request("GET", "/users/username/{username}", username=username)
 
     async def get_guild(self, guild_id : str, /) -> Dict[str, Union[str, Dict]]:
-        return await self._request("GET", f"/guilds/{guild_id}")
+        return await self._request("GET", "/guilds/{guild_id}", guild_id=guild_id)
     
     async def delete_guild(self, guild_id : str, /) -> None:
-        await self._request("DELETE", f"/guilds/{guild_id}")
+        await self._request("DELETE", "/guilds/{guild_id}", guild_id=guild_id)
     
-    async def create_guild(self, name : str, save_chat : bool, /) -> None: #support upload image later
+    async def create_guild(self, name : str, save_chat : bool, /, *, image=None) -> None:
         send_data = {
             "name": name,
             "saveChat": save_chat
         }
-        await self._request("POST", "/guilds", data=send_data)
+        # image is a files.Upload, streamed as multipart
+        await self._request("POST", "/guilds", data=send_data, files=[("image", image)] if image is not None else None)
 
     async def edit_guild(self, guild_id : str, /, * , name : Optional[str] = None, save_chat : Optional[bool]= None, owner_id : Optional[str]= None) -> None:
         send_data = {
@@ -279,80 +626,79 @@ class Caller:
             "saveChat": save_chat,
             "ownerId": owner_id
         }
-        await self._request("PATCH", f"/guilds/{guild_id}", data=send_data)
+        await self._request("PATCH", "/guilds/{guild_id}", data=send_data, guild_id=guild_id)
 
     async def join_guild(self, invite : str, /) -> None:
         send_data = {
             "invite": invite
         }
-        await self._request("POST", f"/guilds/join", data=send_data)
+        await self._request("POST", "/guilds/join", data=send_data)
 
     async def send_message(self, guild_id: str, message: str, /) -> None:
         send_data = {
             "content": message
         }
-        print("sending msg")
-        await self._request("POST", f"/guilds/{guild_id}/msgs", data=send_data)
+        await self._request("POST", "/guilds/{guild_id}/msgs", data=send_data, guild_id=guild_id)
     
     async def start_typing(self, guild_id:str, /) -> None:
-        await self._request("POST", f"/guilds/{guild_id}/msgs/typing")
+        await self._request("POST", "/guilds/{guild_id}/msgs/typing", guild_id=guild_id)
 
     async def read_messages(self, guild_id : str, /) -> None:
-        await self._request("POST", f"/guilds/{guild_id}/msgs/read")
+        await self._request("POST", "/guilds/{guild_id}/msgs/read", guild_id=guild_id)
     
     async def clear_msgs(self, guild_id : str, /) -> None:
-        await self._request("DELETE", f"/guilds/{guild_id}/msgs/clear")
+        await self._request("DELETE", "/guilds/{guild_id}/msgs/clear", guild_id=guild_id)
     
     async def delete_msg(self, guild_id: str, msg_id : str, /) -> None:
-        await self._request("DELETE", f"/guilds/{guild_id}/msgs/{msg_id}")
+        await self._request("DELETE", "/guilds/{guild_id}/msgs/{msg_id}", guild_id=guild_id, msg_id=msg_id)
     
     async def edit_msg(self, guild_id : str, msg_id : str, content : str,/) -> None:
         send_data = {
             "content": content
         }
-        await self._request("PATCH", f"/guilds/{guild_id}/msgs/{msg_id}", data=send_data)
+        await self._request("PATCH", "/guilds/{guild_id}/msgs/{msg_id}", data=send_data, guild_id=guild_id, msg_id=msg_id)
     
     async def add_admin(self, guild_id : str, user_id : str, /) -> None:
-        await self._request("PUT", f"/guilds/{guild_id}/admins/{user_id}")
+        await self._request("PUT", "/guilds/{guild_id}/admins/{user_id}", guild_id=guild_id, user_id=user_id)
     
     async def remove_admin(self, guild_id : str, user_id : str, /) -> None:
-        await self._request("DELETE", f"/guilds/{guild_id}/admins/{user_id}")
+        await self._request("DELETE", "/guilds/{guild_id}/admins/{user_id}", guild_id=guild_id, user_id=user_id)
     
     async def ban_user(self, guild_id : str, user_id : str, /) -> None:
-        await self._request("PUT", f"/guilds/{guild_id}/bans/{user_id}")
+        await self._request("PUT", "/guilds/{guild_id}/bans/{user_id}", guild_id=guild_id, user_id=user_id)
     
     async def unban_user(self, guild_id : str, user_id : str, /) -> None:
-        await self._request("DELETE", f"/guilds/{guild_id}/bans/{user_id}")
+        await self._request("DELETE", "/guilds/{guild_id}/bans/{user_id}", guild_id=guild_id, user_id=user_id)
     
     async def kick_user(self, guild_id : str, user_id : str, /) -> None:
-        await self._request("DELETE", f"/guilds/{guild_id}/members/{user_id}")
+        await self._request("DELETE", "/guilds/{guild_id}/members/{user_id}", guild_id=guild_id, user_id=user_id)
     
     async def create_invite(self, guild_id : str, /):
-        await self._request("POST", f"/guilds/{guild_id}/invites")
+        await self._request("POST", "/guilds/{guild_id}/invites", guild_id=guild_id)
 
     async def delete_invite(self, guild_id : str, invite : str, /):
-        await self._request("DELETE", f"/guilds/{guild_id}/invites/{invite}")
+        await self._request("DELETE", "/guilds/{guild_id}/invites/{invite}", guild_id=guild_id, invite=invite)
 
     async def add_friend(self, user_id : str, /) -> None:
-        await self._request("PUT", f"/users/@me/friends/{user_id}")
+        await self._request("PUT", "/users/@me/friends/{user_id}", user_id=user_id)
     
     async def add_friend_by_name(self, username: str,/) -> None:
         send_data = {
             "username": username
         }
-        await self._request("PUT", f"/users/@me/friends", send_data)
+        await self._request("PUT", "/users/@me/friends", data=send_data)
     
     async def remove_friend(self, user_id : str, /) -> None:
-        await self._request("DELETE", f"/users/@me/friends/{user_id}")
+        await self._request("DELETE", "/users/@me/friends/{user_id}", user_id=user_id)
     
     async def accept_friend_request(self, user_id : str, /) -> None:
-        await self._request("POST", f"/users/@me/requests/{user_id}/accept")
+        await self._request("POST", "/users/@me/requests/{user_id}/accept", user_id=user_id)
     
     async def decline_friend_request(self, user_id : str, /) -> None:
-        await self._request("POST", f"/users/@me/requests/{user_id}/decline")
+        await self._request("POST", "/users/@me/requests/{user_id}/decline", user_id=user_id)
     
     async def leave_guild(self, guild_id : str, /) -> None:
-        await self._request("DELETE", f"/users/@me/guilds/{guild_id}")
+        await self._request("DELETE", "/users/@me/guilds/{guild_id}", guild_id=guild_id)
     
     async def clear_self__msgs(self) -> None:
         await self._request("DELETE", "/users/@me/msgs")
@@ -364,13 +710,13 @@ class Caller:
         await self._request("POST", "/users/@me/dms", data=send_data)
     
     async def leave_dm(self, dm_id : str, /) -> None:
-        await self._request("DELETE", f"/users/@me/dms/{dm_id}")
+        await self._request("DELETE", "/users/@me/dms/{dm_id}", dm_id=dm_id)
     
     async def block_user(self, user_id :str, /) -> None:
-        await self._request("PUT", f"/users/@me/blocked/{user_id}")
+        await self._request("PUT", "/users/@me/blocked/{user_id}", user_id=user_id)
     
     async def unblock_user(self, user_id : str, /) -> None:
-        await self._request("DELETE", f"/users/@me/blocked/{user_id}")
+        await self._request("DELETE", "/users/@me/blocked/{user_id}", user_id=user_id)
     
     async def edit_self(self, password : str, /, *, new_password : Optional[str] = None,username: Optional[str] = None, email : Optional[str] = None, options : Optional[int] = None) -> None:
         send_data = {
@@ -380,4 +726,4 @@ class Caller:
             "email": email,
             "options": options
         }
-        await self._request("PATCH", f"/users/@me", data=send_data)
\ No newline at end of file
+        await self._request("PATCH", "/users/@me", data=send_data)
\ No newline at end of file
@@ -0,0 +1,111 @@
+import asyncio
+from typing import AsyncIterator, Optional
+
+from events import Guild, Dm, Msg, User
+
+
+async def _cancel(task: Optional[asyncio.Task]) -> None:
+    if task is not None and not task.done():
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+
+
+async def history(caller, guild_id: str, /, *, before: int = 0, page_size: int = 50, limit: Optional[int] = None,
+                  fetch=None) -> AsyncIterator[Msg]:
+    """
+    Iterate over the messages of a guild from newest to oldest.
+
+    Pages are fetched with the `time` cursor of the oldest message seen so
+    far and the next page is requested while the current one is consumed.
+    Breaking out of the loop cancels the prefetch so nothing more is fetched.
+
+    Args:
+        before: only messages created before this time, 0 for the latest
+        page_size: messages per request
+        limit: stop after this many messages, None for the whole history
+        fetch: called instead of caller.get_messages, such as a client's store backed fetch
+    """
+    remaining = limit
+    # messages sharing the cursor time may come back on the next page
+    boundary = set()
+
+    get_messages = fetch if fetch is not None else caller.get_messages
+
+    def fetch(cursor, size):
+        return asyncio.ensure_future(get_messages(guild_id, time=cursor, limit=size))
+
+    cursor = before
+    size = page_size if remaining is None else min(page_size, remaining)
+    task = fetch(cursor, size) if size > 0 else None
+    try:
+        while task is not None:
+            page = await task
+            task = None
+            if not page:
+                return
+            oldest = min(msg["created"] for msg in page)
+            if oldest == cursor and all(msg["id"] in boundary for msg in page):
+                return  # no progress, only repeats of the last page
+            # a short page means we reached the beginning
+            last_page = len(page) < size
+            if not last_page and (remaining is None or remaining > len(page)):
+                next_size = page_size if remaining is None else min(page_size, remaining - len(page))
+                task = fetch(oldest, next_size)
+            cursor = oldest
+            seen = {msg["id"] for msg in page if msg["created"] == oldest}
+            for msg in page:
+                if msg["id"] in boundary:
+                    continue
+                yield Msg.decode(msg)
+                if remaining is not None:
+                    remaining -= 1
+                    if remaining <= 0:
+                        return
+            boundary = seen
+            size = page_size if remaining is None else min(page_size, remaining)
+    finally:
+        await _cancel(task)
+
+
+async def guilds(caller) -> AsyncIterator[Guild]:
+    """
+    Iterate over the guilds the user is in, building each model as it is reached.
+    """
+    guild_list = await caller.get_guilds()
+    for guild in guild_list["guilds"]:
+        guild = Guild.decode(guild)
+        guild.dm = False
+        yield guild
+
+
+async def dms(caller) -> AsyncIterator[Dm]:
+    guild_list = await caller.get_guilds()
+    for dm in guild_list["dms"]:
+        yield Dm.decode(dm)
+
+
+async def members(caller, guild_id: Optional[str] = None, /) -> AsyncIterator[User]:
+    """
+    Iterate over the members of a guild, or of every guild the user is in.
+
+    When going over every guild the member list of the next guild is fetched
+    while the current one is consumed.
+    """
+    if guild_id is not None:
+        guild_ids = [guild_id]
+    else:
+        guild_ids = [guild["id"] for guild in (await caller.get_guilds())["guilds"]]
+    task = None
+    try:
+        for index, current in enumerate(guild_ids):
+            page = await task if task is not None else await caller.get_members(current)
+            task = None
+            if index + 1 < len(guild_ids):
+                task = asyncio.ensure_future(caller.get_members(guild_ids[index + 1]))
+            for user in page:
+                yield User.decode(user)
+    finally:
+        await _cancel(task)
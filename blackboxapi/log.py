@@ -0,0 +1,57 @@
+import json
+import logging
+import sys
+from typing import Optional, TextIO
+
+# every logger of the library lives under this one, so
+# logging.getLogger("blackboxapi").setLevel(...) controls all of them
+ROOT = "blackboxapi"
+
+gateway_log = logging.getLogger(f"{ROOT}.gateway")
+dispatch_log = logging.getLogger(f"{ROOT}.dispatch")
+http_log = logging.getLogger(f"{ROOT}.http")
+
+# no NullHandler on purpose, with logging left unconfigured warnings and
+# errors (like handler exceptions) still reach stderr through logging.lastResort
+
+# extra fields picked up by JsonFormatter when passed through `extra=`
+STRUCTURED_FIELDS = ("event", "guild_id", "latency", "route", "status")
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one json object per line for log ingestion.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(level: int = logging.INFO, *, json_output: bool = False, stream: Optional[TextIO] = None) -> logging.Handler:
+    """
+    Send the library logs to `stream` (stderr by default), as text or json lines.
+
+    Returns:
+        the handler that was added
+    """
+    handler = logging.StreamHandler(stream or sys.stderr)
+    if json_output:
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logger = logging.getLogger(ROOT)
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    return handler
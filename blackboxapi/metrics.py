@@ -0,0 +1,174 @@
+import contextvars
+import itertools
+import os
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# span the current task is running under, tasks created inside a span inherit it
+current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("blackboxapi_span", default=None)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_span_ids = itertools.count(1)
+
+
+class Span:
+    __slots__ = ("name", "attrs", "trace_id", "span_id", "parent_id", "start", "duration")
+
+    def __init__(self, name: str, attrs: Dict[str, object], parent: Optional["Span"]) -> None:
+        self.name = name
+        self.attrs = attrs
+        self.span_id = next(_span_ids)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(8).hex()
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+
+    def __repr__(self) -> str:
+        return f"<Span {self.name} trace={self.trace_id} id={self.span_id} parent={self.parent_id} duration={self.duration}>"
+
+
+class Metrics:
+    """
+    Metrics and tracing hooks called by the library, this base class does nothing.
+
+    Subclass it to forward to another metrics system, or use Registry for an
+    in-process one. Instrumented code checks `enabled` before measuring, so
+    the default costs one attribute lookup.
+    """
+
+    enabled = False
+
+    def inc(self, name: str, value: float = 1, /, **labels: str) -> None:
+        pass
+
+    def observe(self, name: str, value: float, /, **labels: str) -> None:
+        pass
+
+    def gauge(self, name: str, value: float, /, **labels: str) -> None:
+        pass
+
+    def start_span(self, name: str, /, **attrs: object) -> Optional[Span]:
+        """
+        Start a span as a child of the current one, returns None when tracing is off.
+        """
+        return None
+
+    def end_span(self, span: Optional[Span]) -> None:
+        pass
+
+
+NULL_METRICS = Metrics()
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry(Metrics):
+    """
+    In-process metrics store with a Prometheus text exporter.
+
+    Args:
+        tracing: record spans, finished ones are kept in `spans`
+        max_spans: number of finished spans kept
+        buckets: histogram bucket bounds in seconds
+    """
+
+    enabled = True
+
+    def __init__(self, *, tracing: bool = False, max_spans: int = 1000, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.tracing = tracing
+        self.buckets = buckets
+        self.counters: Dict[LabelKey, float] = {}
+        self.gauges: Dict[LabelKey, float] = {}
+        self.histograms: Dict[LabelKey, Histogram] = {}
+        self.spans: Deque[Span] = deque(maxlen=max_spans)
+
+    def inc(self, name: str, value: float = 1, /, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, /, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        try:
+            histogram = self.histograms[key]
+        except KeyError:
+            histogram = self.histograms[key] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def gauge(self, name: str, value: float, /, **labels: str) -> None:
+        self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def start_span(self, name: str, /, **attrs: object) -> Optional[Span]:
+        if not self.tracing:
+            return None
+        return Span(name, attrs, current_span.get())
+
+    def end_span(self, span: Optional[Span]) -> None:
+        if span is None:
+            return
+        span.duration = time.perf_counter() - span.start
+        self.spans.append(span)
+        self.on_span_end(span)
+
+    def on_span_end(self, span: Span) -> None:
+        """
+        Called for every finished span, override to export them.
+        """
+
+    def get(self, name: str, /, **labels: str) -> Optional[float]:
+        key = (name, tuple(sorted(labels.items())))
+        if key in self.counters:
+            return self.counters[key]
+        return self.gauges.get(key)
+
+    def prometheus(self) -> str:
+        """
+        Everything recorded in the Prometheus text exposition format.
+        """
+        lines: List[str] = []
+        for kind, values in (("counter", self.counters), ("gauge", self.gauges)):
+            for name in sorted({name for name, _ in values}):
+                lines.append(f"# TYPE {name} {kind}")
+                for (metric, labels), value in values.items():
+                    if metric == name:
+                        lines.append(f"{name}{_labels(labels)} {value}")
+        for name in sorted({name for name, _ in self.histograms}):
+            lines.append(f"# TYPE {name} histogram")
+            for (metric, labels), histogram in self.histograms.items():
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
@@ -0,0 +1,113 @@
+import asyncio
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+
+class SendQueue:
+    """
+    Outbound message queue, sends are queued and the caller gets a future back.
+
+    Messages to one guild are sent in order, different guilds are sent in
+    parallel with at most `concurrency` requests in flight. With a `window`
+    the first message to a guild waits that many seconds so messages queued
+    right after it can be joined into a single message.
+
+    Args:
+        concurrency: max send requests in flight
+        window: seconds to wait for more messages to merge, None sends right away
+        max_length: merged messages are never longer than this
+        separator: put between merged messages
+    """
+
+    def __init__(self, *, concurrency: int = 5, window: Optional[float] = None, max_length: int = 2000, separator: str = "\n") -> None:
+        self.concurrency = concurrency
+        self.window = window
+        self.max_length = max_length
+        self.separator = separator
+        self.sent = 0  # requests made
+        self.merged = 0  # messages that were folded into another one
+
+        self.caller = None
+        self.tasks = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pending: Dict[str, Deque[Tuple[str, asyncio.Future]]] = {}
+        self._senders: Dict[str, asyncio.Task] = {}
+        self._flushing = False
+
+    def attach(self, caller, tasks) -> None:
+        self.caller = caller
+        self.tasks = tasks
+        tasks.add_shutdown_hook(self.flush)
+
+    @property
+    def queued(self) -> int:
+        return sum(len(pending) for pending in self._pending.values())
+
+    def put(self, guild_id: str, message: str) -> asyncio.Future:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        future = asyncio.get_running_loop().create_future()
+        try:
+            pending = self._pending[guild_id]
+        except KeyError:
+            pending = self._pending[guild_id] = deque()
+        pending.append((message, future))
+        if guild_id not in self._senders:
+            self._senders[guild_id] = self.tasks.create_task(self._sender(guild_id), name=f"send_queue_{guild_id}")
+        return future
+
+    async def flush(self) -> None:
+        """
+        Send everything queued right away and wait for it to be delivered.
+        """
+        self._flushing = True
+        try:
+            while self._senders:
+                await asyncio.gather(*self._senders.values(), return_exceptions=True)
+        finally:
+            self._flushing = False
+
+    def _take(self, pending: Deque[Tuple[str, asyncio.Future]]) -> Tuple[str, List[asyncio.Future]]:
+        message, future = pending.popleft()
+        futures = [future]
+        if self.window is None:
+            return message, futures
+        parts = [message]
+        length = len(message)
+        while pending and length + len(self.separator) + len(pending[0][0]) <= self.max_length:
+            message, future = pending.popleft()
+            parts.append(message)
+            futures.append(future)
+            length += len(self.separator) + len(message)
+        self.merged += len(parts) - 1
+        return self.separator.join(parts), futures
+
+    async def _sender(self, guild_id: str) -> None:
+        pending = self._pending[guild_id]
+        futures: List[asyncio.Future] = []
+        try:
+            while pending:
+                if self.window is not None and not self._flushing:
+                    await asyncio.sleep(self.window)
+                message, futures = self._take(pending)
+                async with self._semaphore:
+                    try:
+                        await self.caller.send_message(guild_id, message)
+                    except Exception as e:
+                        for future in futures:
+                            if not future.done():
+                                future.set_exception(e)
+                    else:
+                        for future in futures:
+                            if not future.done():
+                                future.set_result(None)
+                    self.sent += 1
+        except asyncio.CancelledError:
+            for future in futures + [future for _, future in pending]:
+                future.cancel()
+            pending.clear()
+            raise
+        finally:
+            del self._senders[guild_id]
+            if not pending:
+                del self._pending[guild_id]
@@ -0,0 +1,170 @@
+import asyncio
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+# headers sent by the server, reset after is in seconds
+LIMIT_HEADER = "X-RateLimit-Limit"
+REMAINING_HEADER = "X-RateLimit-Remaining"
+RESET_AFTER_HEADER = "X-RateLimit-Reset-After"
+GLOBAL_HEADER = "X-RateLimit-Global"
+RETRY_AFTER_HEADER = "Retry-After"
+
+
+class Bucket:
+    """
+    Token bucket for a single route template.
+
+    Waiters are released in the order they called acquire. A limit of None
+    means the budget is not known yet so requests pass straight through
+    until the server sends rate limit headers.
+    """
+
+    def __init__(self, limit: Optional[int] = None, per: float = 1.0) -> None:
+        self.limit = limit
+        self.per = per
+        self.remaining = limit
+        self.reset_at = 0.0
+        # set by a 429, nothing goes through before this even without a known limit
+        self.blocked_until = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _take(self, now: float) -> bool:
+        if now < self.blocked_until:
+            return False
+        if self.limit is None:
+            return True
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.per
+        if self.remaining > 0:
+            self.remaining -= 1
+            return True
+        return False
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        # anyone already queued goes first, otherwise FIFO order breaks
+        if not self._waiters and self._take(loop.time()):
+            return
+        future = loop.create_future()
+        self._waiters.append(future)
+        self._schedule(loop)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future in self._waiters:
+                self._waiters.remove(future)
+            elif self.limit is not None:
+                # token was handed over as we got cancelled, give it back
+                self.remaining = min(self.limit, self.remaining + 1)
+                self._release()
+            raise
+
+    def _schedule(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._timer is not None or not self._waiters:
+            return
+        wake_at = self.blocked_until
+        if self.limit is not None and self.remaining <= 0:
+            wake_at = max(wake_at, self.reset_at)
+        delay = max(0.0, wake_at - loop.time())
+        self._timer = loop.call_later(delay, self._release)
+
+    def _release(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        while self._waiters:
+            if self._waiters[0].done():
+                self._waiters.popleft()
+                continue
+            if not self._take(now):
+                break
+            self._waiters.popleft().set_result(None)
+        self._schedule(loop)
+
+    def update(self, limit: int, remaining: int, reset_after: float) -> None:
+        now = asyncio.get_running_loop().time()
+        self.limit = limit
+        self.remaining = remaining
+        self.reset_at = now + reset_after
+        if self._waiters:
+            self._release()
+
+    def block(self, retry_after: float) -> None:
+        loop = asyncio.get_running_loop()
+        self.blocked_until = max(self.blocked_until, loop.time() + retry_after)
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._schedule(loop)
+
+
+class RateLimiter:
+    """
+    Keeps a bucket per (method, route template) plus an optional global bucket.
+
+    Args:
+        static: (requests, seconds) budget used for every route until the
+            server sends rate limit headers
+        global_limit: (requests, seconds) budget shared across all routes
+        max_retries: how many times a request is retried after a 429
+    """
+
+    def __init__(self, *, static: Optional[Tuple[int, float]] = None, global_limit: Optional[Tuple[int, float]] = None, max_retries: int = 3) -> None:
+        self.static = static
+        self.max_retries = max_retries
+        self.buckets: Dict[Tuple[str, str], Bucket] = {}
+        self.global_bucket = Bucket(*global_limit) if global_limit is not None else Bucket()
+        self.hits = 0  # number of 429 responses received
+
+    def get_bucket(self, request_type: str, route: str, /) -> Bucket:
+        key = (request_type, route)
+        try:
+            return self.buckets[key]
+        except KeyError:
+            bucket = Bucket(*self.static) if self.static is not None else Bucket()
+            self.buckets[key] = bucket
+            return bucket
+
+    async def acquire(self, bucket: Bucket, /) -> None:
+        await bucket.acquire()
+        await self.global_bucket.acquire()
+
+    def update(self, bucket: Bucket, headers, /) -> None:
+        try:
+            limit = int(headers[LIMIT_HEADER])
+            remaining = int(headers[REMAINING_HEADER])
+            reset_after = float(headers[RESET_AFTER_HEADER])
+        except (KeyError, ValueError):
+            return
+        bucket.update(limit, remaining, reset_after)
+
+    def on_429(self, bucket: Bucket, headers, /) -> None:
+        self.hits += 1
+        try:
+            retry_after = float(headers.get(RETRY_AFTER_HEADER) or headers.get(RESET_AFTER_HEADER))
+        except (TypeError, ValueError):
+            retry_after = bucket.per or 1.0
+        if headers.get(GLOBAL_HEADER, "").lower() == "true":
+            self.global_bucket.block(retry_after)
+        else:
+            bucket.block(retry_after)
+
+    def stats(self) -> Dict[str, Dict[str, Optional[float]]]:
+        stats = {
+            f"{request_type} {route}": {"limit": bucket.limit, "remaining": bucket.remaining, "queued": bucket.queued}
+            for (request_type, route), bucket in self.buckets.items()
+        }
+        stats["global"] = {
+            "limit": self.global_bucket.limit,
+            "remaining": self.global_bucket.remaining,
+            "queued": self.global_bucket.queued,
+        }
+        return stats
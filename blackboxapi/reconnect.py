@@ -0,0 +1,52 @@
+import random
+import time
+from typing import Dict, Optional
+
+
+class Backoff:
+    """
+    Exponential backoff with full jitter, delay(n) is random between 0 and min(cap, base * 2**n).
+    """
+
+    def __init__(self, *, base: float = 1.0, cap: float = 60.0) -> None:
+        self.base = base
+        self.cap = cap
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+
+class ConnectionStats:
+    """
+    Reconnect count and time spent disconnected for the gateway connection.
+    """
+
+    def __init__(self) -> None:
+        self.connects = 0
+        self.reconnects = 0
+        self.resumes = 0
+        self.downtime = 0.0
+        self.disconnected_at: Optional[float] = None
+
+    def connected(self) -> None:
+        self.connects += 1
+        if self.disconnected_at is not None:
+            self.reconnects += 1
+            self.downtime += time.monotonic() - self.disconnected_at
+            self.disconnected_at = None
+
+    def disconnected(self) -> None:
+        if self.disconnected_at is None:
+            self.disconnected_at = time.monotonic()
+
+    def as_dict(self) -> Dict[str, float]:
+        downtime = self.downtime
+        if self.disconnected_at is not None:
+            downtime += time.monotonic() - self.disconnected_at
+        return {
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "resumes": self.resumes,
+            "downtime": downtime,
+            "connected": self.disconnected_at is None and self.connects > 0,
+        }
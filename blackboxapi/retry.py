@@ -0,0 +1,146 @@
+import asyncio
+import time
+from typing import Callable, Dict, FrozenSet, Iterable, Optional
+
+from log import http_log
+from reconnect import Backoff
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# methods that do the same thing when sent twice
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Whether an error from a request is worth retrying.
+    """
+    import aiohttp
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500
+    return isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending a request while the breaker of its route is open.
+    """
+
+    def __init__(self, route: str, retry_after: float) -> None:
+        super().__init__(f"{route} is failing, not retrying for {retry_after:.1f}s")
+        self.route = route
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Failure tracking for one route template.
+
+    After `threshold` transient failures in a row the breaker opens and
+    requests fail right away with CircuitOpenError. Once `reset_timeout`
+    seconds passed one request is let through, success closes the breaker
+    and another failure opens it again.
+    """
+
+    def __init__(self, route: str, *, threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.route = route
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0  # transient failures in a row
+        self.opened = 0  # times it opened
+        self.opened_at = 0.0
+        self._probing = False
+
+    def before(self) -> None:
+        """
+        Called before sending, raises CircuitOpenError if the request should not go out.
+        """
+        if self.state == CLOSED:
+            return
+        now = time.monotonic()
+        if self.state == OPEN:
+            retry_after = self.opened_at + self.reset_timeout - now
+            if retry_after > 0:
+                raise CircuitOpenError(self.route, retry_after)
+            self.state = HALF_OPEN
+        # half open, only one request finds out whether the route recovered
+        if self._probing:
+            raise CircuitOpenError(self.route, 0.0)
+        self._probing = True
+
+    def success(self) -> None:
+        self._probing = False
+        self.failures = 0
+        self.state = CLOSED
+
+    def failure(self) -> None:
+        self._probing = False
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.threshold:
+            if self.state != OPEN:
+                self.opened += 1
+                http_log.warning("Circuit for %s opened after %d failures", self.route, self.failures,
+                                 extra={"route": self.route})
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def abandoned(self) -> None:
+        # the probe was cancelled, let the next request try
+        self._probing = False
+
+    def as_dict(self) -> Dict[str, object]:
+        return {"state": self.state, "failures": self.failures, "opened": self.opened}
+
+
+class RetryPolicy:
+    """
+    Retries transient REST failures (connection errors, timeouts, 5xx) with
+    jittered backoff, and keeps a circuit breaker for every route template.
+
+    Only idempotent methods are retried unless `methods` says otherwise or
+    the call asks for it. Rate limits (429) are handled by the rate limiter
+    before this sees them.
+
+    Args:
+        retries: extra attempts after the first one
+        backoff: delay between attempts
+        methods: methods that are retried
+        retry_on: decides whether an error is transient
+        breaker_threshold: transient failures in a row that open a route's breaker, None disables breakers
+        breaker_reset: seconds an open breaker fails fast before letting a request through
+    """
+
+    def __init__(self, *, retries: int = 2, backoff: Optional[Backoff] = None, methods: Iterable[str] = IDEMPOTENT_METHODS,
+                 retry_on: Callable[[BaseException], bool] = is_transient, breaker_threshold: Optional[int] = 5,
+                 breaker_reset: float = 30.0) -> None:
+        self.retries = retries
+        self.backoff = backoff if backoff is not None else Backoff(base=0.25, cap=5.0)
+        self.methods: FrozenSet[str] = frozenset(methods)
+        self.retry_on = retry_on
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.retried = 0  # attempts after a transient failure
+        self.gave_up = 0  # requests that failed after every attempt
+        self.short_circuited = 0  # requests refused by an open breaker
+
+    def breaker(self, route: str) -> Optional[CircuitBreaker]:
+        if self.breaker_threshold is None:
+            return None
+        try:
+            return self.breakers[route]
+        except KeyError:
+            breaker = self.breakers[route] = CircuitBreaker(route, threshold=self.breaker_threshold,
+                                                            reset_timeout=self.breaker_reset)
+            return breaker
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "retried": self.retried,
+            "gave_up": self.gave_up,
+            "short_circuited": self.short_circuited,
+            "breakers": {route: breaker.as_dict() for route, breaker in self.breakers.items()},
+        }
@@ -0,0 +1,64 @@
+import asyncio
+import signal
+import sys
+from typing import Any, Awaitable, Callable, List, Optional
+
+from log import gateway_log
+
+
+def _uvloop(use_uvloop: Optional[bool]):
+    # None uses uvloop when it is installed, True requires it
+    if use_uvloop is False:
+        return None
+    try:
+        import uvloop
+    except ImportError:
+        if use_uvloop:
+            raise
+        return None
+    return uvloop
+
+
+def run_main(main: Callable[[], Awaitable[Any]], *, shutdown: Callable[[], Awaitable[Any]], debug: bool = False,
+             use_uvloop: Optional[bool] = None) -> None:
+    """
+    Run main() on a new event loop until it returns, then close the loop.
+
+    The first SIGINT or SIGTERM starts shutdown(), which should make main
+    return on its own, a second one cancels main.
+
+    Args:
+        debug: asyncio debug mode, slow, for finding blocking calls and unawaited coroutines
+        use_uvloop: run on uvloop, None uses it when it is installed
+    """
+    async def supervised():
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        closing: List[asyncio.Task] = []
+
+        def on_signal(sig: signal.Signals) -> None:
+            if closing:
+                gateway_log.warning("Received %s during shutdown, cancelling", sig.name)
+                task.cancel()
+                return
+            gateway_log.info("Received %s, shutting down", sig.name)
+            closing.append(loop.create_task(shutdown()))
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, on_signal, sig)
+            except (NotImplementedError, RuntimeError):
+                pass  # windows or not the main thread
+        await main()
+
+    uvloop = _uvloop(use_uvloop)
+    try:
+        if sys.version_info >= (3, 11):
+            with asyncio.Runner(debug=debug, loop_factory=uvloop.new_event_loop if uvloop is not None else None) as runner:
+                runner.run(supervised())
+        else:
+            if uvloop is not None:
+                asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+            asyncio.run(supervised(), debug=debug)
+    except asyncio.CancelledError:
+        pass
@@ -0,0 +1,300 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from codec import Codec, default_codec
+from events import Msg
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    guild_id TEXT NOT NULL,
+    author_id TEXT,
+    created INTEGER,
+    content TEXT,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_guild_created ON messages (guild_id, created);
+CREATE INDEX IF NOT EXISTS messages_author_created ON messages (author_id, created);
+-- ranges of creation times of a guild for which every message is stored,
+-- "end" is NULL while the range is kept current by the gateway
+CREATE TABLE IF NOT EXISTS coverage (
+    guild_id TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    "end" INTEGER
+);
+CREATE INDEX IF NOT EXISTS coverage_guild ON coverage (guild_id);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(content, content='messages', content_rowid='rowid');
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (new.rowid, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+    INSERT INTO messages_fts (rowid, content) VALUES (new.rowid, new.content);
+END;
+"""
+
+# an upsert updates the row in place, REPLACE would delete it without firing the fts delete trigger
+UPSERT = (
+    "INSERT INTO messages (id, guild_id, author_id, created, content, data) VALUES (?, ?, ?, ?, ?, ?)"
+    " ON CONFLICT (id) DO UPDATE SET guild_id = excluded.guild_id, author_id = excluded.author_id,"
+    " created = excluded.created, content = excluded.content, data = excluded.data"
+)
+
+
+def _payload(msg: Msg) -> Dict[str, Any]:
+    # the raw slots still hold the payload of lazy attributes, so this is the message as received
+    return {key: getattr(msg, slot) for key, slot, _ in Msg.__schema__}
+
+
+def _author_id(payload: Dict[str, Any]) -> Optional[str]:
+    author = payload.get("author")
+    return author.get("id") if isinstance(author, dict) else None
+
+
+class MessageStore:
+    """
+    SQLite archive of messages, fed by the gateway and by message fetches.
+
+    Messages are indexed by guild and creation time and by author, with a
+    full text index on the content when SQLite has FTS5. The store also
+    remembers which time ranges of a guild it holds completely, so a
+    get_messages (or a history page) inside such a range is answered
+    without a request. Ranges come from fetched pages, and a range fetched
+    while the gateway is connected stays open at the top and is kept
+    current by message events until the connection is lost.
+
+    The connection can be used from any thread, so a client stores fetched
+    pages from an executor while events are applied on the loop.
+
+    Args:
+        path: database file, ":memory:" for a store that lasts as long as the process
+    """
+
+    EVENTS = frozenset({"message_create", "message_update", "message_delete"})
+
+    def __init__(self, path: str = ":memory:", *, codec: Optional[Codec] = None) -> None:
+        self.path = path
+        self.codec = codec if codec is not None else default_codec
+        self.hits = 0  # fetches answered from the store
+        self.misses = 0
+        # autocommit, writes are grouped in explicit transactions by _transaction
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._lock = threading.RLock()
+        # commits are frequent and small, WAL keeps them from syncing every time
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        try:
+            self._db.executescript(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            # built without fts5, search falls back to LIKE
+            self.fts = False
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT count(*) FROM messages").fetchone()[0]
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        # in autocommit mode `with self._db` does not open a transaction and every row would be its own commit
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                yield
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def _row(self, payload: Dict[str, Any]) -> Tuple:
+        return (payload["id"], payload["guildId"], _author_id(payload), payload.get("created"),
+                payload.get("content"), self.codec.dumps(payload))
+
+    def add(self, payloads: List[Dict[str, Any]]) -> None:
+        rows = [self._row(payload) for payload in payloads]
+        with self._transaction():
+            self._db.executemany(UPSERT, rows)
+
+    def update(self, event: str, data: Msg) -> None:
+        """
+        Apply a message event, called for every message_* dispatch.
+        """
+        match event:
+            case "message_create":
+                row = self._row(_payload(data))
+                with self._transaction():
+                    self._db.execute(UPSERT, row)
+            case "message_update":
+                with self._transaction():
+                    self._edit(_payload(data))
+            case "message_delete":
+                with self._transaction():
+                    self._db.execute("DELETE FROM messages WHERE id = ?", (data.id,))
+
+    def _edit(self, payload: Dict[str, Any]) -> None:
+        # updates only carry what changed, the rest comes from the stored message
+        row = self._db.execute("SELECT data FROM messages WHERE id = ?", (payload["id"],)).fetchone()
+        if row is not None:
+            stored = self.codec.loads(row[0])
+            stored.update({key: value for key, value in payload.items() if value is not None})
+            payload = stored
+        elif payload.get("created") is None:
+            return  # never stored and cannot be placed in time
+        self._db.execute(UPSERT, self._row(payload))
+
+    # coverage
+
+    def _coverage(self, guild_id: str) -> List[Tuple[int, Optional[int]]]:
+        return self._db.execute('SELECT start, "end" FROM coverage WHERE guild_id = ? ORDER BY start', (guild_id,)).fetchall()
+
+    def cover(self, guild_id: str, start: int, end: Optional[int]) -> None:
+        """
+        Record that every message of the guild created in [start, end] is stored, None for an open end.
+        """
+        with self._transaction():
+            self._cover(guild_id, start, end)
+
+    def _cover(self, guild_id: str, start: int, end: Optional[int]) -> None:
+        intervals = self._coverage(guild_id) + [(start, end)]
+        intervals.sort(key=lambda interval: interval[0])
+        merged: List[List[Optional[int]]] = []
+        for start, end in intervals:
+            if merged and (merged[-1][1] is None or merged[-1][1] + 1 >= start):
+                last = merged[-1]
+                last[1] = None if last[1] is None or end is None else max(last[1], end)
+            else:
+                merged.append([start, end])
+        self._db.execute("DELETE FROM coverage WHERE guild_id = ?", (guild_id,))
+        self._db.executemany('INSERT INTO coverage (guild_id, start, "end") VALUES (?, ?, ?)',
+                             [(guild_id, start, end) for start, end in merged])
+
+    def add_page(self, guild_id: str, page: List[Dict[str, Any]], *, time: int, limit: int, live: bool) -> None:
+        """
+        Store a page returned by get_messages and the range it covers, in one transaction.
+
+        The range runs from the oldest message of the page up to the cursor,
+        an empty page or one with messages of unknown time covers nothing.
+        Blocking, a client calls it from an executor.
+
+        Args:
+            time: the cursor the page was fetched with, 0 for the newest messages
+            live: the gateway was connected for the whole request, so newer messages arrive as events
+        """
+        rows = [self._row(payload) for payload in page]
+        created = [payload["created"] for payload in page if payload.get("created") is not None]
+        covered = None
+        if created and len(created) == len(page):
+            start = min(created)
+            if time > 0:
+                end = time - 1
+            elif live:
+                end = None
+            else:
+                end = max(created)
+            if end is None or start <= end:
+                covered = (start, end)
+        with self._transaction():
+            self._db.executemany(UPSERT, rows)
+            if covered is not None:
+                self._cover(guild_id, *covered)
+
+    def connection_lost(self) -> None:
+        """
+        Close the open ranges at the newest stored message, events can be missed from here on.
+        """
+        with self._transaction():
+            self._db.execute(
+                'UPDATE coverage SET "end" = max(start, coalesce('
+                '(SELECT max(created) FROM messages WHERE messages.guild_id = coverage.guild_id), start))'
+                ' WHERE "end" IS NULL'
+            )
+
+    def get(self, guild_id: str, time: int, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        What get_messages(guild_id, time=time, limit=limit) would return, or None if it is not all stored.
+        """
+        with self._lock:
+            rows = self._get(guild_id, time, limit)
+        if rows is None:
+            return None
+        loads = self.codec.loads
+        return [loads(data) for _, data in rows]
+
+    def _get(self, guild_id: str, time: int, limit: int) -> Optional[List[Tuple[int, bytes]]]:
+        for start, end in self._coverage(guild_id):
+            # the server returns messages created before `time`
+            if time > 0 and start < time and (end is None or end >= time - 1):
+                break
+            if time <= 0 and end is None:
+                break
+        else:
+            self.misses += 1
+            return None
+        if time > 0:
+            rows = self._db.execute(
+                "SELECT created, data FROM messages WHERE guild_id = ? AND created < ? ORDER BY created DESC, id DESC LIMIT ?",
+                (guild_id, time, limit)).fetchall()
+        else:
+            rows = self._db.execute(
+                "SELECT created, data FROM messages WHERE guild_id = ? ORDER BY created DESC, id DESC LIMIT ?",
+                (guild_id, limit)).fetchall()
+        # the page has to end inside the range unless the range starts at the first message
+        if (len(rows) < limit and start > 0) or (rows and rows[-1][0] < start):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return rows
+
+    # queries
+
+    def search(self, query: str, /, *, guild_id: Optional[str] = None, author_id: Optional[str] = None,
+               limit: int = 50) -> List[Msg]:
+        """
+        Stored messages matching a full text query, newest first.
+
+        With FTS5 the query uses its syntax (words, "phrases", prefix*,
+        AND/OR/NOT), without it the query is matched as a substring.
+        """
+        if self.fts:
+            sql = "SELECT m.data FROM messages_fts f JOIN messages m ON m.rowid = f.rowid WHERE messages_fts MATCH ?"
+            params: List[Any] = [query]
+        else:
+            sql = "SELECT m.data FROM messages m WHERE m.content LIKE ?"
+            params = [f"%{query}%"]
+        if guild_id is not None:
+            sql += " AND m.guild_id = ?"
+            params.append(guild_id)
+        if author_id is not None:
+            sql += " AND m.author_id = ?"
+            params.append(author_id)
+        sql += " ORDER BY m.created DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [Msg.decode(self.codec.loads(data)) for data, in rows]
+
+    def by_author(self, author_id: str, /, *, guild_id: Optional[str] = None, limit: int = 50) -> List[Msg]:
+        """
+        Stored messages of one author, newest first.
+        """
+        with self._lock:
+            if guild_id is None:
+                rows = self._db.execute("SELECT data FROM messages WHERE author_id = ? ORDER BY created DESC LIMIT ?",
+                                        (author_id, limit)).fetchall()
+            else:
+                rows = self._db.execute("SELECT data FROM messages WHERE author_id = ? AND guild_id = ? ORDER BY created DESC LIMIT ?",
+                                        (author_id, guild_id, limit)).fetchall()
+        return [Msg.decode(self.codec.loads(data)) for data, in rows]
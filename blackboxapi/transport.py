@@ -0,0 +1,77 @@
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+# imported by the methods using it, so the package loads without it until the first session is made
+if TYPE_CHECKING:
+    import aiohttp
+
+
+class Transport:
+    """
+    Connection pool and timeout settings for the REST session.
+
+    Args:
+        endpoint: host and path prefix of the api, defaults to ENDPOINT_URL
+        secure: use https and wss instead of http and ws
+        limit: max open connections in the pool, 0 for no limit
+        limit_per_host: max open connections to the same host, 0 for no limit
+        keepalive_timeout: seconds an idle connection is kept open for reuse
+        use_dns_cache: cache dns lookups
+        ttl_dns_cache: seconds a dns lookup is cached for
+        total_timeout: seconds a whole request may take, None for no limit
+        connect_timeout: seconds to wait for a free connection and to connect
+        read_timeout: seconds to wait between reads of the response
+        unix_socket: path of a unix socket to connect through instead of tcp
+        http2: not supported by aiohttp, kept so configs fail loudly
+    """
+
+    def __init__(self, *, endpoint: Optional[str] = None, secure: bool = False, limit: int = 100, limit_per_host: int = 0,
+                 keepalive_timeout: float = 30.0, use_dns_cache: bool = True, ttl_dns_cache: Optional[int] = 300,
+                 total_timeout: Optional[float] = None, connect_timeout: Optional[float] = 10.0,
+                 read_timeout: Optional[float] = None, unix_socket: Optional[str] = None, http2: bool = False) -> None:
+        if http2:
+            raise ValueError("aiohttp only speaks HTTP/1.1, http2 is not supported")
+        self.endpoint = endpoint
+        self.secure = secure
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.use_dns_cache = use_dns_cache
+        self.ttl_dns_cache = ttl_dns_cache
+        self.total_timeout = total_timeout
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.unix_socket = unix_socket
+
+    def session_options(self) -> Dict[str, Any]:
+        """
+        The settings that go into the session, endpoint and secure are read per request instead.
+        """
+        return {
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "keepalive_timeout": self.keepalive_timeout,
+            "use_dns_cache": self.use_dns_cache,
+            "ttl_dns_cache": self.ttl_dns_cache,
+            "total_timeout": self.total_timeout,
+            "connect_timeout": self.connect_timeout,
+            "read_timeout": self.read_timeout,
+            "unix_socket": self.unix_socket,
+        }
+
+    def create_connector(self) -> "aiohttp.BaseConnector":
+        import aiohttp
+        if self.unix_socket is not None:
+            return aiohttp.UnixConnector(path=self.unix_socket, limit=self.limit, limit_per_host=self.limit_per_host,
+                                         keepalive_timeout=self.keepalive_timeout)
+        return aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host,
+                                    keepalive_timeout=self.keepalive_timeout, use_dns_cache=self.use_dns_cache,
+                                    ttl_dns_cache=self.ttl_dns_cache)
+
+    def create_timeout(self) -> "aiohttp.ClientTimeout":
+        import aiohttp
+        return aiohttp.ClientTimeout(total=self.total_timeout, connect=self.connect_timeout,
+                                     sock_read=self.read_timeout)
+
+    def create_session(self) -> "aiohttp.ClientSession":
+        import aiohttp
+        return aiohttp.ClientSession(connector=self.create_connector(), timeout=self.create_timeout())
@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# the modules import each other by their plain names, the fake server lives with the benchmarks
+sys.path.insert(0, os.path.join(ROOT, "blackboxapi"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
@@ -0,0 +1,38 @@
+import asyncio
+from collections import Counter
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from core import Client
+from reconnect import Backoff
+from retry import RetryPolicy
+from transport import Transport
+
+
+def test_bulk_leaves_retries_to_the_retry_policy():
+    requests = Counter()
+
+    async def ban(request):
+        user_id = request.match_info["user_id"]
+        requests[user_id] += 1
+        return web.Response(status=502 if user_id == "bad" else 200)
+
+    async def main():
+        app = web.Application()
+        app.router.add_put("/api/guilds/{guild_id}/bans/{user_id}", ban)
+        async with TestServer(app, host="127.0.0.1") as server:
+            client = Client(token="token", transport=Transport(endpoint=f"127.0.0.1:{server.port}/api"))
+            client.caller.retry = RetryPolicy(retries=2, backoff=Backoff(base=0.001, cap=0.001))
+            client.caller._start_session()
+            try:
+                # the bad id goes first so its failures are in before the others are sent
+                return await client.ban_users("1", ["bad"] + [str(index) for index in range(20)], concurrency=1)
+            finally:
+                await client.caller._stop_session()
+
+    report = asyncio.run(main())
+    # one try and two retries, all by the policy
+    assert requests["bad"] == 3
+    assert [result.id for result in report.failed] == ["bad"]
+    assert len(report.succeeded) == 20
@@ -0,0 +1,105 @@
+from cache import LRUCache, State
+from events import Dm, Guild, Invite, Member, User
+
+
+def user(index, **fields):
+    return User(str(index), name=f"user{index}", **fields)
+
+
+def member(guild_id, index):
+    return Member.decode({"admin": False, "owner": False, "userInfo": {"id": str(index), "name": f"user{index}"},
+                          "guildId": guild_id})
+
+
+def test_lru_evicts_the_oldest_entry_at_the_limit():
+    cache = LRUCache(2)
+    assert cache.set("a", 1) is False
+    assert cache.set("b", 2) is False
+    assert cache.set("c", 3) is True
+    assert list(cache) == ["b", "c"]
+    assert cache.evictions == 1
+
+
+def test_lru_read_refreshes_recency():
+    cache = LRUCache(2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert list(cache) == ["a", "c"]
+    # peek does not count as a use
+    cache.peek("a")
+    cache.set("d", 4)
+    assert list(cache) == ["c", "d"]
+    assert (cache.hits, cache.misses) == (1, 0)
+    assert cache.get("a") is None and cache.misses == 1
+
+
+def test_limits_are_per_kind():
+    state = State({"users": 2, "guilds": 3})
+    for index in range(5):
+        state.store_user(user(index))
+        state.store_guild(Guild(str(index)))
+    assert list(state.users) == ["3", "4"]
+    assert list(state.guilds) == ["2", "3", "4"]
+    assert state.stats()["users"]["max_size"] == 2
+    # untouched kinds keep the default
+    assert state.dms.max_size == 1000
+
+
+def test_evicting_a_guild_makes_the_guild_list_incomplete():
+    state = State({"guilds": 2})
+    state.set_guild_list([Guild("1"), Guild("2")], [])
+    assert state.get_guild_list() is not None
+    state.update("guild_create", Guild("3"))
+    assert state.get_guild_list() is None
+
+
+def test_updates_merge_into_cached_objects():
+    state = State()
+    state.store_user(user(1, flags=1))
+    state.update("user_info_update", User("1", name="renamed"))
+    cached = state.users.peek("1")
+    assert cached.name == "renamed"
+    assert cached.flags == 1
+    state.store_guild(Guild("5", name="old"))
+    state.update("guild_update", Guild("5", name="new"))
+    assert state.guilds.peek("5").name == "new"
+
+
+def test_delete_events_remove_entries():
+    state = State()
+    state.set_guild_list([Guild("1"), Guild("2")],
+                         [Dm.decode({"id": "9", "userInfo": {"id": "8"}, "unread": None})])
+    state.set_members("1", [user(10), user(11)])
+    state.set_invites("1", ["abc"])
+
+    state.update("guild_delete", Guild("1"))
+    assert "1" not in state.guilds
+    assert state.get_members("1") is None
+    assert state.get_invites("1") is None
+
+    state.update("dm_delete", Dm.decode({"id": "9", "userInfo": {"id": "8"}, "unread": None}))
+    assert "9" not in state.dms
+
+
+def test_member_events_keep_member_lists_current():
+    state = State()
+    state.set_members("1", [user(10)])
+    state.update("member_add", member("1", 11))
+    assert sorted(member.id for member in state.get_members("1")) == ["10", "11"]
+    state.update("member_remove", member("1", 10))
+    state.update("member_ban_add", member("1", 11))
+    assert state.get_members("1") == []
+    # guilds without a cached list are left alone
+    state.update("member_add", member("2", 12))
+    assert state.get_members("2") is None
+    assert "12" in state.users
+
+
+def test_invite_events_keep_invite_lists_current():
+    state = State()
+    state.set_invites("1", ["abc"])
+    state.update("invite_create", Invite("1", "def"))
+    state.update("invite_delete", Invite("1", "abc"))
+    assert state.get_invites("1") == ["def"]
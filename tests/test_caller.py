@@ -0,0 +1,76 @@
+import asyncio
+
+from aiohttp import web
+
+from ratelimit import RateLimiter
+from test_ratelimit import Api
+
+
+def test_empty_get_body_is_none():
+    api = Api(lambda index: (204, {}) if index == 0 else (200, {}))
+
+    async def calls(caller):
+        return [await caller._request("GET", "/users/@me"), await caller._request("GET", "/users/@me/guilds")]
+
+    assert asyncio.run(api.run(RateLimiter(), calls)) == [None, None]
+
+
+class JsonApi(Api):
+    """
+    Answers every request with its own number as json, after `delay` seconds.
+    """
+
+    def __init__(self, delay=0.0):
+        super().__init__()
+        self.delay = delay
+
+    async def handle(self, request):
+        await super().handle(request)
+        index = len(self.received) - 1
+        await asyncio.sleep(self.delay)
+        return web.json_response({"request": index})
+
+
+def test_concurrent_identical_gets_share_one_request():
+    api = JsonApi(delay=0.05)
+
+    async def calls(caller):
+        ones = await asyncio.gather(*(caller.get_user("1") for _ in range(5)))
+        twos = await asyncio.gather(caller.get_user("2"), caller.get_user("2"))
+        # nothing in flight anymore, the next one is a new request
+        return ones, twos, await caller.get_user("1"), caller.coalesced
+
+    ones, twos, again, coalesced = asyncio.run(api.run(RateLimiter(), calls))
+    assert sorted(path for _, path, _ in api.received) == ["/api/users/1", "/api/users/1", "/api/users/2"]
+    assert all(result is ones[0] for result in ones)
+    assert twos[0] is twos[1] and twos[0] != ones[0]
+    assert again != ones[0]
+    assert coalesced == 5
+
+
+def test_cancelled_waiter_does_not_cancel_the_shared_request():
+    api = JsonApi(delay=0.1)
+
+    async def calls(caller):
+        tasks = [asyncio.create_task(caller.get_user("1")) for _ in range(3)]
+        await asyncio.sleep(0.02)
+        tasks[0].cancel()
+        return await asyncio.gather(*tasks[1:])
+
+    first, second = asyncio.run(api.run(RateLimiter(), calls))
+    assert first == second == {"request": 0}
+    assert len(api.received) == 1
+
+
+def test_non_gets_are_never_coalesced():
+    api = JsonApi(delay=0.05)
+
+    async def calls(caller):
+        await asyncio.gather(*(caller.ban_user("1", "2") for _ in range(3)),
+                             *(caller.send_message("1", "same") for _ in range(3)),
+                             *(caller._request("DELETE", "/guilds/{guild_id}", guild_id="1") for _ in range(2)))
+        return caller.coalesced
+
+    assert asyncio.run(api.run(RateLimiter(), calls)) == 0
+    paths = sorted(path for _, path, _ in api.received)
+    assert paths == ["/api/guilds/1"] * 2 + ["/api/guilds/1/bans/2"] * 3 + ["/api/guilds/1/msgs"] * 3
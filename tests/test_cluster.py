@@ -0,0 +1,36 @@
+import logging
+import time
+
+import pytest
+
+from cluster import Cluster, ProcessCluster
+from core import Client
+from reconnect import Backoff
+from transport import Transport
+
+
+def unreachable_client(token):
+    # nothing listens on port 1, the client keeps reconnecting until it is closed
+    logging.getLogger("blackboxapi").setLevel(logging.CRITICAL)
+    return Client(token=token, transport=Transport(endpoint="127.0.0.1:1/api"), backoff=Backoff(base=0.05, cap=0.1))
+
+
+def test_stop_returns_with_unread_stats():
+    cluster = ProcessCluster(unreachable_client, ["a", "b"], processes=2, stats_interval=0.001)
+    cluster.start()
+    # plenty of stats pile up in the queue while nobody reads them
+    time.sleep(1.0)
+    start = time.monotonic()
+    cluster.stop(timeout=3)
+    assert time.monotonic() - start < 3.5
+    assert not any(process.is_alive() for process in cluster.processes)
+    assert cluster.stats()["clients"] == 2
+
+
+def test_client_transport_must_match_the_shared_session():
+    cluster = Cluster([Client(token="a", transport=Transport(endpoint="example.com/api"))])
+    with pytest.raises(ValueError, match="unix_socket"):
+        cluster.add(Client(token="b", transport=Transport(unix_socket="/tmp/api.sock")))
+    with pytest.raises(ValueError, match="limit"):
+        Cluster([Client(token="c", transport=Transport(limit=5))], transport=Transport(limit=50))
+    Cluster([Client(token="d", transport=Transport(limit=50))], transport=Transport(limit=50))
@@ -0,0 +1,214 @@
+import asyncio
+
+import pytest
+
+import payloads
+from commands import BadArgument, CommandOnCooldown, Router
+from events import Msg, User
+
+
+class FakeClient:
+    def __init__(self):
+        self.sent = []
+
+    async def get_self(self):
+        return User.decode(payloads.user(0))
+
+    async def send_message(self, guild_id, message):
+        self.sent.append((guild_id, message))
+
+
+def msg(content, author=1, guild_id="7"):
+    return Msg.decode({"id": "1", "guildId": guild_id, "content": content, "author": payloads.user(author)})
+
+
+def dispatch(router, *messages, client=None):
+    client = client or FakeClient()
+
+    async def main():
+        for message in messages:
+            await router.dispatch(client, message)
+
+    asyncio.run(main())
+    return client
+
+
+def recording_router(**kwargs):
+    router = Router(**kwargs)
+    errors = []
+
+    @router.error
+    async def on_error(ctx, error):
+        errors.append(error)
+
+    return router, errors
+
+
+def test_prefixes_and_aliases():
+    router = Router(prefix=("!", "?"))
+    calls = []
+
+    @router.command(aliases=("p",))
+    async def ping(ctx):
+        calls.append((ctx.prefix, ctx.invoked_with, ctx.command.name, ctx.guild_id))
+        await ctx.reply("pong")
+
+    client = dispatch(router, msg("!ping"), msg("?p"), msg("ping"), msg("#ping"), msg(""))
+    assert calls == [("!", "ping", "ping", "7"), ("?", "p", "ping", "7")]
+    assert client.sent == [("7", "pong"), ("7", "pong")]
+    assert router.find("!ping now")[1:] == ("!", "ping", "now")
+    assert router.find("no prefix") is None
+
+
+def test_case_insensitive_names():
+    router = Router(case_insensitive=True)
+    calls = []
+
+    @router.command()
+    async def Ping(ctx):
+        calls.append(ctx.invoked_with)
+
+    dispatch(router, msg("!PING"), msg("!ping"))
+    assert calls == ["PING", "ping"]
+    assert Router().find("!PING") is None
+
+
+def test_unknown_commands_are_counted_and_ignored():
+    router, errors = recording_router()
+
+    @router.command()
+    async def ping(ctx):
+        pass
+
+    dispatch(router, msg("!pong"), msg("!"), msg("! ping"))
+    assert router.unknown == 3
+    assert errors == []
+
+
+def test_own_messages_are_ignored():
+    router = Router()
+    calls = []
+
+    @router.command()
+    async def ping(ctx):
+        calls.append(ctx.author.id)
+
+    dispatch(router, msg("!ping", author=0), msg("!ping", author=1))
+    assert calls == [payloads.user(1)["id"]]
+
+
+def test_argument_conversion():
+    router = Router()
+    calls = []
+
+    @router.command()
+    async def ban(ctx, user_id: str, days: int = 0, notify: bool = False, *, reason: str = ""):
+        calls.append((user_id, days, notify, reason))
+
+    @router.command()
+    async def total(ctx, *numbers: float):
+        calls.append(sum(numbers))
+
+    dispatch(router, msg("!ban 5"), msg("!ban  5   3 yes spamming  links "), msg("!total 1 2.5  3"), msg("!total"))
+    assert calls == [("5", 0, False, ""), ("5", 3, True, "spamming  links"), 6.5, 0]
+
+
+@pytest.mark.parametrize("content, message", [
+    ("!ban", "missing argument user_id"),
+    ("!ban 5 three", "bad value for days: 'three'"),
+    ("!ban 5 3 maybe", "bad value for notify: 'maybe'"),
+    ("!total 1 x", "bad value for numbers: 'x'"),
+])
+def test_conversion_errors_go_to_the_error_handler(content, message):
+    router, errors = recording_router()
+    calls = []
+
+    @router.command()
+    async def ban(ctx, user_id: str, days: int = 0, notify: bool = False):
+        calls.append(user_id)
+
+    @router.command()
+    async def total(ctx, *numbers: float):
+        calls.append(numbers)
+
+    dispatch(router, msg(content))
+    assert calls == []
+    assert len(errors) == 1 and isinstance(errors[0], BadArgument)
+    assert str(errors[0]) == message
+
+
+def test_async_converters_are_awaited():
+    router, errors = recording_router()
+    calls = []
+
+    async def lookup(raw):
+        if raw == "nobody":
+            raise KeyError(raw)
+        return User.decode(payloads.user(int(raw)))
+
+    @router.command()
+    async def whois(ctx, user: lookup):
+        calls.append(user.name)
+
+    dispatch(router, msg("!whois 3"), msg("!whois nobody"))
+    assert calls == ["user3"]
+    assert str(errors[0]) == "bad value for user: 'nobody'"
+
+
+def test_cooldown_per_user():
+    router, errors = recording_router()
+    calls = []
+
+    @router.command(cooldown=(1, 60.0))
+    async def ping(ctx):
+        calls.append(ctx.author.id)
+
+    dispatch(router, msg("!ping", author=1), msg("!ping", author=1), msg("!ping", author=2))
+    assert calls == [payloads.user(1)["id"], payloads.user(2)["id"]]
+    assert isinstance(errors[0], CommandOnCooldown) and errors[0].retry_after > 59
+
+
+def test_middleware_wraps_in_order():
+    router = Router()
+    order = []
+
+    @router.middleware
+    async def outer(ctx, call_next):
+        order.append("outer")
+        await call_next()
+        order.append("outer done")
+
+    @router.middleware
+    async def inner(ctx, call_next):
+        order.append("inner")
+        await call_next()
+
+    @router.command()
+    async def ping(ctx):
+        order.append("ping")
+
+    dispatch(router, msg("!ping"))
+    assert order == ["outer", "inner", "ping", "outer done"]
+
+
+def test_duplicate_and_invalid_names():
+    router = Router()
+
+    @router.command(aliases=("p",))
+    async def ping(ctx):
+        pass
+
+    with pytest.raises(ValueError, match="already registered"):
+        @router.command(name="p")
+        async def other(ctx):
+            pass
+
+    with pytest.raises(ValueError, match="Invalid command name"):
+        @router.command(name="two words")
+        async def spaced(ctx):
+            pass
+
+    with pytest.raises(TypeError):
+        @router.command()
+        def blocking(ctx):
+            pass
@@ -0,0 +1,68 @@
+import json
+import zlib
+
+import pytest
+
+import compression
+from compression import ZLIB_SUFFIX, CompressionStats, ZlibStream
+from payloads import frame, message_create
+
+
+def compressed_messages(count):
+    # one compressor for the whole connection, every message ends with a sync flush like the server sends it
+    compressor = zlib.compressobj()
+    messages = [json.dumps(frame("MESSAGE_CREATE", message_create(index))).encode() for index in range(count)]
+    return messages, [compressor.compress(message) + compressor.flush(zlib.Z_SYNC_FLUSH) for message in messages]
+
+
+def test_sync_flushed_messages_end_with_the_suffix():
+    _, chunks = compressed_messages(3)
+    assert all(chunk.endswith(ZLIB_SUFFIX) for chunk in chunks)
+
+
+def test_round_trip_over_one_stream():
+    messages, chunks = compressed_messages(20)
+    stream = ZlibStream(CompressionStats())
+    assert [stream.feed(chunk) for chunk in chunks] == messages
+
+
+def test_message_split_across_frames():
+    messages, chunks = compressed_messages(3)
+    stats = CompressionStats()
+    stream = ZlibStream(stats)
+    assert stream.feed(chunks[0]) == messages[0]
+    # split the second message so that no part but the last ends with the suffix
+    middle = chunks[1]
+    parts = [middle[:5], middle[5:len(middle) // 2], middle[len(middle) // 2:]]
+    assert [stream.feed(part) for part in parts] == [None, None, messages[1]]
+    assert stream.feed(chunks[2]) == messages[2]
+    assert stats.frames == 3
+    assert stats.compressed_bytes == sum(map(len, chunks))
+
+
+def test_the_stream_cannot_start_mid_connection():
+    _, chunks = compressed_messages(2)
+    with pytest.raises(zlib.error):
+        ZlibStream(CompressionStats()).feed(chunks[1])
+
+
+def test_ratio_and_inflate_time(monkeypatch):
+    clock = iter([1.0, 1.25, 2.0, 2.5])
+    monkeypatch.setattr(compression.time, "thread_time", lambda: next(clock))
+    stats = CompressionStats()
+    assert stats.ratio is None
+    messages, chunks = compressed_messages(2)
+    stream = ZlibStream(stats)
+    for chunk in chunks:
+        stream.feed(chunk)
+    assert stats.inflated_bytes == sum(map(len, messages))
+    assert stats.ratio == stats.inflated_bytes / stats.compressed_bytes
+    # repeated json keys compress well
+    assert stats.ratio > 2
+    assert stats.as_dict() == {
+        "frames": 2,
+        "compressed_bytes": sum(map(len, chunks)),
+        "inflated_bytes": sum(map(len, messages)),
+        "ratio": stats.ratio,
+        "inflate_time": 0.75,
+    }
@@ -0,0 +1,54 @@
+import asyncio
+import json
+
+from core import Client
+from decoder import FrameDecoder, decode_frame
+from events import Msg
+from fakeserver import FakeServer
+from helpers import EVENT_TABLE, Decoded, _event_entry
+from payloads import frame, message_create, message_frames
+from transport import Transport
+
+
+def test_unwanted_dispatches_are_left_raw():
+    message = json.dumps(frame("MESSAGE_CREATE", message_create(0)))
+    assert isinstance(decode_frame("json", message, frozenset())["data"], dict)
+    decoded = decode_frame("json", message, frozenset({"message_create"}))["data"]
+    assert type(decoded) is Decoded and isinstance(decoded.value, Msg)
+
+
+def test_wanted_events_follow_the_handlers():
+    client = Client(token="token")
+    assert "message_create" not in client.wanted_events()
+
+    @client.event
+    async def message_create(self, msg):
+        pass
+
+    assert "message_create" in client.wanted_events()
+    assert "guild_create" in Client(token="token", cache=True).wanted_events()
+
+
+def test_pool_does_not_decode_skipped_events(monkeypatch):
+    decoded = []
+    _, _, decode, _ = _event_entry("MESSAGE_CREATE")
+
+    def counting_decode(data):
+        decoded.append(data)
+        return decode(data)
+
+    monkeypatch.setitem(EVENT_TABLE, "MESSAGE_CREATE", ("message_create", "on_message_create", counting_decode, "guildId"))
+
+    async def main():
+        async with FakeServer([json.dumps(message) for message in message_frames(50)]) as server:
+            client = Client(token="token", transport=Transport(endpoint=server.endpoint),
+                            decoder=FrameDecoder(executor="thread", workers=2))
+            task = asyncio.create_task(client.start())
+            await asyncio.wait_for(server.replayed.wait(), 5)
+            while client.events_skipped < 50:
+                await asyncio.sleep(0.01)
+            await client.close()
+            await asyncio.wait_for(task, 5)
+
+    asyncio.run(main())
+    assert decoded == []
@@ -0,0 +1,109 @@
+import asyncio
+import random
+
+import pytest
+
+from dispatcher import Dispatcher
+from helpers import Tasks
+
+
+def run(dispatcher, main):
+    async def wrapper():
+        tasks = Tasks()
+        dispatcher.start(tasks)
+        try:
+            return await main()
+        finally:
+            await tasks.stop_tasks()
+
+    return asyncio.run(wrapper())
+
+
+def test_events_of_one_key_are_handled_in_order():
+    dispatcher = Dispatcher(workers=3, max_queue=1000)
+    handled = {key: [] for key in "abcdef"}
+    rng = random.Random(1)
+
+    def handler(key):
+        async def handle(index):
+            # uneven handler times, order must come from the sharding not from luck
+            await asyncio.sleep(rng.random() / 1000)
+            handled[key].append(index)
+        return handle
+
+    async def main():
+        for index in range(300):
+            key = "abcdef"[index % 6]
+            await dispatcher.submit(key, handler(key), index, "on_message_create")
+        await dispatcher.join()
+
+    run(dispatcher, main)
+    for offset, key in enumerate("abcdef"):
+        assert handled[key] == list(range(offset, 300, 6))
+    assert dispatcher.handler_stats["on_message_create"].count == 300
+
+
+def test_full_queue_blocks_submit():
+    dispatcher = Dispatcher(workers=1, max_queue=2)
+    release = asyncio.Event()
+
+    async def slow(data):
+        await release.wait()
+
+    async def main():
+        # the worker takes the first one, two more fill the queue
+        for index in range(3):
+            await dispatcher.submit("a", slow, index, "on_message_create")
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        blocked = asyncio.create_task(dispatcher.submit("a", slow, 3, "on_message_create"))
+        await asyncio.sleep(0.05)
+        assert not blocked.done()
+        assert dispatcher.queue_depth == 2
+        release.set()
+        await asyncio.wait_for(blocked, 1)
+        await asyncio.wait_for(dispatcher.join(), 1)
+
+    run(dispatcher, main)
+
+
+@pytest.mark.parametrize("overflow, kept", [("drop_newest", [0, 1, 2]), ("drop_oldest", [0, 2, 3])])
+def test_overflow_drops(overflow, kept):
+    dispatcher = Dispatcher(workers=1, max_queue=2, overflow=overflow)
+    handled = []
+
+    async def main():
+        release = asyncio.Event()
+
+        async def handle(index):
+            if index == 0:
+                await release.wait()
+            handled.append(index)
+
+        await dispatcher.submit("a", handle, 0, "on_message_create")
+        await asyncio.sleep(0)
+        for index in range(1, 4):
+            await dispatcher.submit("a", handle, index, "on_message_create")
+        release.set()
+        await dispatcher.join()
+
+    run(dispatcher, main)
+    assert handled == kept
+    assert dispatcher.dropped == 1
+
+
+def test_join_waits_for_running_handlers():
+    dispatcher = Dispatcher(workers=2)
+    done = []
+
+    async def handle(index):
+        await asyncio.sleep(0.05)
+        done.append(index)
+
+    async def main():
+        for index in range(4):
+            await dispatcher.submit(index, handle, index, "on_message_create")
+        await dispatcher.join()
+        return len(done)
+
+    assert run(dispatcher, main) == 4
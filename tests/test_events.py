@@ -0,0 +1,64 @@
+import pytest
+
+from events import Dm, Member, Msg, User, ValidationError
+from payloads import message_create, user
+
+
+def test_decode_fills_required_and_optional_fields():
+    decoded = User.decode({"id": "1", "name": "alice"})
+    assert (decoded.id, decoded.name, decoded.email, decoded.flags) == ("1", "alice", None, None)
+
+
+def test_missing_required_field():
+    data = message_create(0)
+    del data["guildId"]
+    with pytest.raises(ValidationError, match="Msg payload is missing required field 'guildId'"):
+        Msg.decode(data)
+
+
+@pytest.mark.parametrize("data", [None, "1", ["1"], 1])
+def test_payload_must_be_an_object(data):
+    with pytest.raises(ValidationError, match="User payload must be an object"):
+        User.decode(data)
+
+
+def test_validation_error_is_a_value_error():
+    with pytest.raises(ValueError):
+        User.decode({})
+
+
+def test_nested_models_are_decoded_on_access():
+    data = message_create(0, mentions=3, attachments=2)
+    decoded = Msg.decode(data)
+    assert isinstance(decoded.author, User) and decoded.author.id == data["author"]["id"]
+    assert decoded.author is decoded.author
+    assert [mention.id for mention in decoded.mentions] == [mention["id"] for mention in data["mentions"]]
+    assert [attachment.filename for attachment in decoded.attachments] == [
+        attachment["filename"] for attachment in data["attachments"]]
+    dm = Dm.decode({"id": "9", "userInfo": user(1), "unread": {"msgId": "3", "count": 1, "time": 0, "mentions": 0}})
+    assert dm.user_info.name == "user1" and dm.unread.msg_id == "3"
+
+
+def test_absent_optional_nested_models_are_none():
+    decoded = Msg.decode({"id": "1", "guildId": "2", "content": ""})
+    assert decoded.author is None and decoded.mentions is None and decoded.attachments is None
+
+
+def test_nested_wrong_types():
+    member = Member.decode({"admin": False, "owner": False, "userInfo": "100000"})
+    with pytest.raises(ValidationError, match="User payload must be an object, got str"):
+        member.user_info
+    data = message_create(0)
+    data["mentions"] = user(0)
+    with pytest.raises(ValidationError, match="mentions must be a list, got dict"):
+        Msg.decode(data).mentions
+    data["attachments"] = [{"id": "1", "filename": "a.png"}]
+    with pytest.raises(ValidationError, match="missing required field 'type'"):
+        Msg.decode(data).attachments
+
+
+def test_unknown_keys_are_ignored():
+    data = dict(user(0), nickname="ignored", extra={"nested": True})
+    decoded = User.decode(data)
+    assert decoded.id == data["id"] and decoded.name == data["name"]
+    assert not hasattr(decoded, "nickname") and not hasattr(decoded, "__dict__")
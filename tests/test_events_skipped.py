@@ -0,0 +1,47 @@
+import asyncio
+
+from core import Client
+import payloads
+from store import MessageStore
+
+
+def dispatch(client, event, data):
+    async def main():
+        await client._process_event(data, event)
+        return set(task.get_name() for task in client.tasks._tasks)
+
+    return asyncio.run(main())
+
+
+def test_cache_and_store_are_updated_without_scheduling_handlers():
+    client = Client(token="token", cache=True, message_store=MessageStore())
+    member = {"admin": False, "owner": False, "userInfo": payloads.user(1), "guildId": "2"}
+    assert dispatch(client, "MEMBER_ADD", member) == set()
+    assert dispatch(client, "MESSAGE_CREATE", payloads.message_create(0)) == set()
+    assert client.events_skipped == 2
+    assert len(client.message_store) == 1
+    assert client.state.users.peek(payloads.user(1)["id"]) is not None
+
+
+def test_registered_handlers_are_scheduled():
+    client = Client(token="token", message_store=MessageStore())
+    received = []
+
+    @client.event
+    async def message_create(self, msg):
+        received.append(msg)
+
+    async def main():
+        await client._process_event(payloads.message_create(0), "MESSAGE_CREATE")
+        await asyncio.gather(*client.tasks._tasks)
+
+    asyncio.run(main())
+    assert len(received) == 1
+    assert client.events_skipped == 0
+    assert len(client.message_store) == 1
+
+
+def test_events_nobody_needs_are_skipped_before_decoding():
+    client = Client(token="token")
+    assert dispatch(client, "MESSAGE_CREATE", payloads.message_create(0)) == set()
+    assert client.events_skipped == 1
@@ -0,0 +1,117 @@
+import asyncio
+import json
+
+from core import Client
+from fakeserver import FakeServer
+from payloads import message_create
+from reconnect import Backoff
+from transport import Transport
+
+
+def frames(count):
+    return [json.dumps({"op": 0x0, "data": message_create(index), "event": "message_create", "seq": index + 1})
+            for index in range(count)]
+
+
+class RecordingClient(Client):
+    def __init__(self, server, **kwargs):
+        super().__init__(token="token", transport=Transport(endpoint=server.endpoint), **kwargs)
+        self.ready_count = 0
+        self.messages = 0
+
+    async def on_ready(self):
+        self.ready_count += 1
+
+    async def on_message_create(self, msg):
+        self.messages += 1
+
+
+async def wait_for(condition, timeout=5.0):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), timeout)
+
+
+def test_reconnects_and_resumes_after_the_server_drops_the_connection():
+    async def main():
+        async with FakeServer(frames(5), close_after_replay=True) as server:
+            client = RecordingClient(server, backoff=Backoff(base=0.01, cap=0.05))
+            task = asyncio.create_task(client.start())
+            await wait_for(lambda: server.connections >= 3 and len(server.identifies) >= 3)
+            await client.close()
+            await asyncio.wait_for(task, 5)
+        first, second = server.identifies[:2]
+        assert "sessionId" not in first
+        assert second["sessionId"] == "session1"
+        assert second["seq"] == 5
+        # resumed sessions do not fire on_ready again
+        assert client.ready_count == 1
+        assert client.connection_stats.resumes >= 2
+        assert client.messages >= 10
+
+    asyncio.run(main())
+
+
+def test_new_session_after_the_server_invalidates_it():
+    async def main():
+        async with FakeServer() as server:
+            client = RecordingClient(server, backoff=Backoff(base=0.01, cap=0.05))
+            task = asyncio.create_task(client.start())
+            await wait_for(lambda: client.ready_count == 1)
+            # op 0x8 drops the session, the next identify starts over
+            await client._handle_frame({"op": 0x8, "data": None, "event": ""})
+            await wait_for(lambda: len(server.identifies) == 2 and client.ready_count == 2)
+            await client.close()
+            await asyncio.wait_for(task, 5)
+        assert "sessionId" not in server.identifies[1]
+
+    asyncio.run(main())
+
+
+def test_close_stops_the_loop():
+    async def main():
+        async with FakeServer() as server:
+            client = RecordingClient(server)
+            task = asyncio.create_task(client.start())
+            await wait_for(lambda: client.ready_count == 1)
+            await client.close()
+            await asyncio.wait_for(task, 5)
+        assert client.websocket.closed
+        assert client.caller.session is None
+
+    asyncio.run(main())
+
+
+def test_close_while_connecting_closes_the_new_socket():
+    async def main():
+        async with FakeServer() as server:
+            client = RecordingClient(server)
+            connect = client._connect
+
+            async def slow_connect():
+                websocket = await connect()
+                await asyncio.sleep(0.2)
+                return websocket
+
+            client._connect = slow_connect
+            task = asyncio.create_task(client.start())
+            await asyncio.sleep(0.05)
+            await client.close()
+            await asyncio.wait_for(task, 2)
+        assert client.websocket.closed
+        assert client.ready_count == 0
+
+    asyncio.run(main())
+
+
+def test_close_during_backoff_does_not_wait_it_out():
+    async def main():
+        # nothing listens on port 1, every connect fails and backs off for up to a minute
+        client = Client(token="token", transport=Transport(endpoint="127.0.0.1:1/api"), backoff=Backoff(base=60, cap=60))
+        task = asyncio.create_task(client.start())
+        await asyncio.sleep(0.3)
+        await client.close()
+        await asyncio.wait_for(task, 2)
+
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+import asyncio
+
+import heartbeat as heartbeat_module
+from core import Client
+from fakeserver import FakeServer
+from heartbeat import Heartbeat
+from reconnect import Backoff
+from transport import Transport
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_acks_pair_with_the_oldest_pending_heartbeat(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(heartbeat_module.time, "perf_counter", clock)
+    heartbeat = Heartbeat()
+    heartbeat.ack()  # nothing sent yet, ignored
+    assert heartbeat.last is None and heartbeat.ack_count == 0
+    clock.now = 1.0
+    heartbeat.sent()
+    clock.now = 2.0
+    heartbeat.sent()
+    clock.now = 2.5
+    heartbeat.ack()
+    assert heartbeat.last == 1.5
+    clock.now = 2.75
+    heartbeat.ack()
+    assert heartbeat.last == 0.75
+    assert heartbeat.stats() == {"last": 0.75, "p50": 1.5, "p99": 1.5, "missed": 0, "sent": 2, "acked": 2}
+
+
+def test_percentiles_over_the_kept_samples(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(heartbeat_module.time, "perf_counter", clock)
+    heartbeat = Heartbeat(samples=10)
+    assert heartbeat.p50 is None
+    for latency in range(1, 21):
+        clock.now = 0.0
+        heartbeat.sent()
+        clock.now = float(latency)
+        heartbeat.ack()
+    # only the last ten, 11 to 20, are kept
+    assert heartbeat.p50 == 16.0
+    assert heartbeat.p99 == 20.0
+
+
+def test_dead_after_more_than_max_missed():
+    heartbeat = Heartbeat(max_missed=2)
+    heartbeat.sent()
+    heartbeat.sent()
+    assert heartbeat.missed == 2 and not heartbeat.dead
+    heartbeat.sent()
+    assert heartbeat.dead
+    heartbeat.reset()
+    assert heartbeat.missed == 0 and not heartbeat.dead
+
+
+async def wait_for(condition, timeout=5.0):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), timeout)
+
+
+def test_reconnects_when_heartbeats_are_not_acked():
+    async def main():
+        # a ping every 25ms
+        async with FakeServer(heartbeat_interval=100, ack_heartbeats=False) as server:
+            client = Client(token="token", transport=Transport(endpoint=server.endpoint),
+                            backoff=Backoff(base=0.01, cap=0.01), heartbeat=Heartbeat(max_missed=2))
+            task = asyncio.create_task(client.start())
+            await wait_for(lambda: server.connections >= 2)
+            # max_missed unacked heartbeats are tolerated, the next check closes the connection
+            assert server.heartbeats >= 3
+            assert client.connection_stats.reconnects >= 1
+            assert client.latency is None
+            # the new connection acks again and the client stays on it
+            server.ack_heartbeats = True
+            await wait_for(lambda: client.heartbeat.ack_count >= 3)
+            connections = server.connections
+            await asyncio.sleep(0.2)
+            assert server.connections == connections
+            assert client.heartbeat.missed <= 1
+            assert 0 < client.latency < 1
+            await client.close()
+            await asyncio.wait_for(task, 5)
+
+    asyncio.run(main())
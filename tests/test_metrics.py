@@ -0,0 +1,26 @@
+import asyncio
+
+from core import Client
+from metrics import Registry
+import payloads
+
+
+def test_event_metrics_share_the_event_label():
+    metrics = Registry()
+    client = Client(token="token", metrics=metrics)
+
+    @client.event
+    async def message_create(self, msg):
+        pass
+
+    async def main():
+        await client._process_event(payloads.message_create(0), "MESSAGE_CREATE")
+        await client._process_event(payloads.user(0), "USER_INFO_UPDATE")
+        await asyncio.gather(*client.tasks._tasks)
+
+    asyncio.run(main())
+    assert metrics.get("events_total", event="message_create") == 1
+    assert metrics.get("events_skipped_total", event="user_info_update") == 1
+    labels = {dict(labels)["event"] for name, labels in metrics.histograms if name == "handler_duration_seconds"}
+    assert labels == {"message_create"}
+    assert 'handler_duration_seconds_count{event="message_create"} 1' in metrics.prometheus()
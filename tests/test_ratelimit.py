@@ -0,0 +1,134 @@
+import asyncio
+import json
+import logging
+import time
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from helpers import Caller
+from ratelimit import RateLimiter
+from retry import RetryPolicy
+from transport import Transport
+
+
+class Api:
+    """
+    Records every request and answers with `respond(request number)`, a (status, headers) pair.
+    """
+
+    def __init__(self, respond=lambda index: (200, {})):
+        self.respond = respond
+        self.received = []  # (time, path, json body)
+
+    async def handle(self, request):
+        body = await request.read()
+        self.received.append((time.monotonic(), request.path, json.loads(body) if body else None))
+        status, headers = self.respond(len(self.received) - 1)
+        return web.Response(status=status, headers=headers)
+
+    async def run(self, rate_limiter, calls):
+        app = web.Application()
+        app.router.add_route("*", "/api/{tail:.*}", self.handle)
+        async with TestServer(app, host="127.0.0.1") as server:
+            caller = Caller("token", rate_limiter=rate_limiter, transport=Transport(endpoint=f"127.0.0.1:{server.port}/api"),
+                            retry=RetryPolicy(retries=0, breaker_threshold=None))
+            caller._start_session()
+            try:
+                return await calls(caller)
+            finally:
+                await caller._stop_session()
+
+
+def test_waiters_are_released_in_fifo_order():
+    api = Api()
+
+    async def calls(caller):
+        await asyncio.gather(*(caller.send_message("1", str(index)) for index in range(6)))
+
+    asyncio.run(api.run(RateLimiter(static=(1, 0.05)), calls))
+    assert [body["content"] for _, _, body in api.received] == [str(index) for index in range(6)]
+    times = [at for at, _, _ in api.received]
+    # one per window
+    assert all(later - earlier >= 0.04 for earlier, later in zip(times, times[1:]))
+
+
+def test_retry_after_blocks_the_route():
+    api = Api(lambda index: (429, {"Retry-After": "0.2"}) if index == 0 else (200, {}))
+
+    async def calls(caller):
+        await caller.send_message("1", "first")
+        # the bucket is still blocked for anything sent right after
+        await caller.send_message("1", "second")
+
+    start = time.monotonic()
+    asyncio.run(api.run(RateLimiter(), calls))
+    (first, _, _), (retried, _, _), (second, _, _) = api.received
+    assert retried - first >= 0.18
+    assert second >= retried
+    assert retried - start >= 0.18
+
+
+def test_global_cap_spans_routes():
+    api = Api()
+
+    async def calls(caller):
+        await asyncio.gather(*(caller.send_message(str(index), "hi") if index % 2 else caller.ban_user("1", str(index))
+                               for index in range(6)))
+
+    asyncio.run(api.run(RateLimiter(global_limit=(2, 0.1)), calls))
+    times = sorted(at for at, _, _ in api.received)
+    assert len({path for _, path, _ in api.received}) == 6
+    # 2 per 0.1s window, the last pair waits for the third window
+    assert times[-1] - times[0] >= 0.18
+    for index in range(len(times) - 2):
+        assert times[index + 2] - times[index] >= 0.09
+
+
+def test_global_429_blocks_other_routes():
+    api = Api(lambda index: (429, {"Retry-After": "0.2", "X-RateLimit-Global": "true"}) if index == 0 else (200, {}))
+
+    async def calls(caller):
+        first = asyncio.create_task(caller.send_message("1", "hi"))
+        await asyncio.sleep(0.05)
+        await caller.ban_user("1", "2")
+        await first
+
+    asyncio.run(api.run(RateLimiter(), calls))
+    (limited, _, _), *rest = api.received
+    assert all(at - limited >= 0.18 for at, _, _ in rest)
+
+
+def test_gives_up_after_max_retries():
+    api = Api(lambda index: (429, {"Retry-After": "0.01"}))
+
+    async def calls(caller):
+        await caller.send_message("1", "hi")
+
+    limiter = RateLimiter(max_retries=2)
+    with pytest.raises(aiohttp.ClientResponseError) as error:
+        asyncio.run(api.run(limiter, calls))
+    assert error.value.status == 429
+    assert len(api.received) == 3
+    assert limiter.hits == 2
+
+
+def test_only_giving_up_is_logged_as_a_warning(caplog):
+    api = Api(lambda index: (429, {"Retry-After": "0.01"}) if index < 2 else (200, {}))
+
+    async def calls(caller):
+        await caller.send_message("1", "hi")
+
+    with caplog.at_level(logging.DEBUG, logger="blackboxapi"):
+        asyncio.run(api.run(RateLimiter(max_retries=2), calls))
+    assert len(api.received) == 3
+    assert [record.levelno for record in caplog.records if "Rate limited" in record.message] == [logging.DEBUG] * 2
+    assert not [record for record in caplog.records if record.levelno >= logging.WARNING]
+
+    api = Api(lambda index: (429, {"Retry-After": "0.01"}))
+    caplog.clear()
+    with pytest.raises(aiohttp.ClientResponseError):
+        asyncio.run(api.run(RateLimiter(max_retries=2), calls))
+    assert [record.levelno for record in caplog.records if record.levelno >= logging.WARNING] == [logging.WARNING]
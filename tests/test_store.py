@@ -0,0 +1,121 @@
+import asyncio
+import threading
+
+from core import Client
+from events import Msg
+from fakeserver import FakeServer
+from store import MessageStore
+from transport import Transport
+
+
+def message(index, content=None, created=None):
+    return {
+        "id": str(index),
+        "guildId": "1",
+        "content": content if content is not None else f"hello {index}",
+        "author": {"id": "7", "name": "user"},
+        "created": created if created is not None else 1000 + index,
+    }
+
+
+def fts_matches(store, query):
+    # straight from the index, search() joins on messages and would hide stale entries
+    return store._db.execute("SELECT count(*) FROM messages_fts WHERE messages_fts MATCH ?", (query,)).fetchone()[0]
+
+
+def test_storing_a_page_again_keeps_one_fts_entry_per_message():
+    store = MessageStore()
+    page = [message(index) for index in range(5)]
+    for _ in range(4):
+        store.add(page)
+    assert len(store) == 5
+    if store.fts:
+        assert fts_matches(store, "hello") == 5
+    assert len(store.search("hello")) == 5
+
+
+def test_edited_content_is_no_longer_found():
+    store = MessageStore()
+    store.add([message(1, content="before edit")])
+    store.update("message_update", Msg.decode({"id": "1", "guildId": "1", "content": "after change"}))
+    assert store.search("before") == []
+    assert [msg.content for msg in store.search("after")] == ["after change"]
+    if store.fts:
+        assert fts_matches(store, "before") == 0
+        assert fts_matches(store, "after") == 1
+
+
+def test_partial_update_keeps_created_and_author():
+    store = MessageStore()
+    page = [message(index, created=2000 - index) for index in range(3)]
+    store.add_page("1", page, time=2001, limit=3, live=False)
+    store.update("message_update", Msg.decode({"id": "1", "guildId": "1", "content": "edited", "modified": 5000}))
+    row = store._db.execute("SELECT author_id, created FROM messages WHERE id = '1'").fetchone()
+    assert row == ("7", 1999)
+    stored = store.get("1", 2001, 3)
+    assert [payload["id"] for payload in stored] == ["0", "1", "2"]
+    assert stored[1]["content"] == "edited"
+    assert stored[1]["modified"] == 5000
+    assert [msg.id for msg in store.by_author("7")] == ["0", "1", "2"]
+
+
+def test_update_of_unknown_message_without_created_is_ignored():
+    store = MessageStore()
+    store.update("message_update", Msg.decode({"id": "9", "guildId": "1", "content": "edited"}))
+    assert len(store) == 0
+
+
+def test_a_short_page_covers_only_its_own_range():
+    store = MessageStore()
+    page = [message(index, created=2000 - index) for index in range(2)]
+    store.add_page("1", page, time=2001, limit=5, live=False)
+    assert store._coverage("1") == [(1999, 2000)]
+    assert [payload["id"] for payload in store.get("1", 2001, 2)] == ["0", "1"]
+    # older messages may exist, the short page does not prove otherwise
+    assert store.get("1", 2001, 5) is None
+    assert store.get("1", 1999, 5) is None
+
+
+def test_an_empty_page_covers_nothing():
+    store = MessageStore()
+    store.add_page("1", [], time=2001, limit=5, live=False)
+    store.add_page("1", [], time=0, limit=5, live=True)
+    assert store._coverage("1") == []
+    assert store.get("1", 0, 5) is None
+
+
+def test_a_page_is_stored_in_one_transaction():
+    store = MessageStore()
+    statements = []
+    store._db.set_trace_callback(statements.append)
+    store.add_page("1", [message(index, created=2000 - index) for index in range(50)], time=2001, limit=50, live=False)
+    assert [statement for statement in statements if statement in ("BEGIN", "COMMIT")] == ["BEGIN", "COMMIT"]
+    assert len(store) == 50
+
+
+def test_client_stores_pages_off_the_loop():
+    threads = []
+    store = MessageStore()
+    add_page = store.add_page
+
+    def recording_add_page(*args, **kwargs):
+        threads.append(threading.current_thread())
+        add_page(*args, **kwargs)
+
+    store.add_page = recording_add_page
+
+    async def main():
+        async with FakeServer() as server:
+            client = Client(token="token", transport=Transport(endpoint=server.endpoint), message_store=store)
+            client.caller._start_session()
+            try:
+                first = await client.get_messages("3", 1700000100000, 10)
+                again = await client.get_messages("3", 1700000100000, 10)
+            finally:
+                await client.caller._stop_session()
+            return first, again, server.requests
+
+    first, again, requests = asyncio.run(main())
+    assert [msg.id for msg in first] == [msg.id for msg in again]
+    assert requests == 1 and store.hits == 1
+    assert len(threads) == 1 and threads[0] is not threading.main_thread()
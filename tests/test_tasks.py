@@ -0,0 +1,44 @@
+import asyncio
+
+from helpers import Tasks
+from outbound import SendQueue
+
+
+class SlowCaller:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, guild_id, message):
+        await asyncio.sleep(0.05)
+        self.sent.append((guild_id, message))
+
+
+def test_messages_queued_while_draining_are_sent():
+    async def main():
+        tasks = Tasks()
+        caller = SlowCaller()
+        queue = SendQueue(window=0.5)
+        queue.attach(caller, tasks)
+        futures = []
+
+        async def handler():
+            await asyncio.sleep(0.1)
+            futures.append(queue.put("1", "bye"))
+
+        tasks.create_task(handler(), name="on_message_create")
+        await tasks.stop_tasks(timeout=2)
+        return caller, futures
+
+    caller, futures = asyncio.run(main())
+    assert caller.sent == [("1", "bye")]
+    assert futures[0].done() and not futures[0].cancelled()
+
+
+def test_handlers_past_the_timeout_are_cancelled():
+    async def main():
+        tasks = Tasks()
+        task = tasks.create_task(asyncio.sleep(10), name="on_message_create")
+        await tasks.stop_tasks(timeout=0.05)
+        return task
+
+    assert asyncio.run(main()).cancelled()